@@ -0,0 +1,246 @@
+# api.py
+import calendar
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+
+from aiohttp import web
+
+
+# === HTTP API ТОЛЬКО ДЛЯ ЧТЕНИЯ ===
+# Работает в том же event loop, что и бот. Каждый ответ помечается
+# ETag и Last-Modified по версии данных журнала (journal.version), поэтому
+# условный GET с актуальной версией получает 304, не касаясь БД.
+# Большие диапазоны отдаются потоком порциями по CHUNK строк.
+#
+#   GET /api/students
+#   GET /api/days/2025-03-03
+#   GET /api/months/2025-03
+#   GET /api/attendance?from=2024-09-01&to=2025-05-31
+#   GET /api/duty?from=2024-09-01&to=2025-05-31
+
+CHUNK = 500
+MAX_RANGE_DAYS = 400
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+
+def create_app(conn, journal) -> web.Application:
+    app = web.Application(middlewares=[conditional_get])
+    app["conn"] = conn
+    app["journal"] = journal
+    app["boot"] = f"{int(time.time()):x}"
+    app.router.add_get("/api/students", students)
+    app.router.add_get("/api/days/{day}", day_status)
+    app.router.add_get("/api/months/{month}", month_matrix)
+    app.router.add_get("/api/attendance", attendance_range)
+    app.router.add_get("/api/duty", duty_history)
+    return app
+
+
+async def start_api(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# === УСЛОВНЫЙ GET ===
+
+def _etag(request) -> str:
+    return f'"{request.app["boot"]}-{request.app["journal"].version}"'
+
+
+def _last_modified(request):
+    # Last-Modified точен до секунды. Пока секунда последнего изменения не
+    # закончилась, в неё может успеть ещё одно — такой заголовок не отдаём,
+    # иначе If-Modified-Since получил бы 304 на уже устаревшие данные.
+    last_modified = int(request.app["journal"].last_modified)
+    if int(time.time()) <= last_modified:
+        return None
+    return formatdate(last_modified, usegmt=True)
+
+
+def _not_modified(request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(request.app["journal"].last_modified) <= since
+    return False
+
+
+@web.middleware
+async def conditional_get(request, handler):
+    if request.match_info.http_exception is not None:
+        return await handler(request)
+    etag = _etag(request)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    last_modified = _last_modified(request)
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if _not_modified(request, etag):
+        return web.Response(status=304, headers=headers)
+    request["cache_headers"] = headers
+    response = await handler(request)
+    if not response.prepared:
+        response.headers.update(headers)
+    return response
+
+
+# === ОБРАБОТЧИКИ ===
+
+def _json(data) -> web.Response:
+    return web.json_response(data, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+
+def _parse_day(value: str) -> str:
+    if not value or not DATE_RE.match(value):
+        raise web.HTTPBadRequest(text="Дата должна быть в формате ГГГГ-ММ-ДД")
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise web.HTTPBadRequest(text="Некорректная дата")
+    return value
+
+
+def _parse_range(request):
+    start = _parse_day(request.query.get("from"))
+    end = _parse_day(request.query.get("to"))
+    if end < start:
+        raise web.HTTPBadRequest(text="to раньше from")
+    span = datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")
+    if span > timedelta(days=MAX_RANGE_DAYS):
+        raise web.HTTPBadRequest(text=f"Диапазон больше {MAX_RANGE_DAYS} дней")
+    return start, end
+
+
+async def students(request):
+    rows = request.app["conn"].execute(
+        "SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC"
+    ).fetchall()
+    return _json([{"user_id": user_id, "name": name} for user_id, name in rows])
+
+
+async def day_status(request):
+    day = _parse_day(request.match_info["day"])
+    rows = request.app["conn"].execute('''
+        SELECT users.user_id, users.name, attendance.status, attendance.reason
+        FROM users LEFT JOIN attendance ON users.user_id = attendance.user_id AND attendance.date=?
+        WHERE users.role='student' AND users.approved=1
+        ORDER BY users.name ASC
+    ''', (day,)).fetchall()
+    return _json({
+        "date": day,
+        "duty": request.app["journal"].duty_on(day),
+        "students": [
+            {"user_id": user_id, "name": name, "status": status, "reason": reason}
+            for user_id, name, status, reason in rows
+        ],
+    })
+
+
+async def month_matrix(request):
+    month = request.match_info["month"]
+    if not MONTH_RE.match(month):
+        raise web.HTTPBadRequest(text="Месяц должен быть в формате ГГГГ-ММ")
+    year, number = int(month[:4]), int(month[5:])
+    if not 1 <= number <= 12:
+        raise web.HTTPBadRequest(text="Некорректный месяц")
+    dates = [f"{month}-{day:02d}" for day in range(1, calendar.monthrange(year, number)[1] + 1)]
+
+    conn = request.app["conn"]
+    students = conn.execute(
+        "SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC"
+    ).fetchall()
+    # Весь месяц одним запросом, а не запрос на каждый день
+    marks = {}
+    for user_id, date, status, reason in conn.execute(
+        "SELECT user_id, date, status, reason FROM attendance WHERE date BETWEEN ? AND ?",
+        (dates[0], dates[-1])
+    ):
+        marks[(user_id, date)] = [status, reason]
+
+    return _json({
+        "month": month,
+        "dates": dates,
+        "students": [
+            {"user_id": user_id, "name": name, "days": [marks.get((user_id, date)) for date in dates]}
+            for user_id, name in students
+        ],
+    })
+
+
+async def _stream(request, fetch_page, render):
+    # fetch_page(after) -> список строк после ключа after (None — с начала)
+    response = web.StreamResponse(headers=request["cache_headers"])
+    response.content_type = "application/json"
+    response.charset = "utf-8"
+    await response.prepare(request)
+    await response.write(b"[")
+    first = True
+    after = None
+    while True:
+        rows = fetch_page(after)
+        if not rows:
+            break
+        chunk = ",".join(json.dumps(render(row), ensure_ascii=False) for row in rows)
+        await response.write((chunk if first else "," + chunk).encode("utf-8"))
+        first = False
+        after = rows[-1]
+        if len(rows) < CHUNK:
+            break
+    await response.write(b"]")
+    await response.write_eof()
+    return response
+
+
+async def attendance_range(request):
+    start, end = _parse_range(request)
+    conn = request.app["conn"]
+
+    def fetch_page(after):
+        last_date, last_user = (after[0], after[1]) if after else ("", 0)
+        return conn.execute('''
+            SELECT attendance.date, attendance.user_id, users.name, attendance.status, attendance.reason
+            FROM attendance JOIN users ON users.user_id = attendance.user_id
+            WHERE attendance.date BETWEEN ? AND ? AND (attendance.date, attendance.user_id) > (?, ?)
+            ORDER BY attendance.date, attendance.user_id
+            LIMIT ?
+        ''', (start, end, last_date, last_user, CHUNK)).fetchall()
+
+    def render(row):
+        date, user_id, name, status, reason = row
+        return {"date": date, "user_id": user_id, "name": name, "status": status, "reason": reason}
+
+    return await _stream(request, fetch_page, render)
+
+
+async def duty_history(request):
+    start, end = _parse_range(request)
+    conn = request.app["conn"]
+
+    def fetch_page(after):
+        last_seq = after[0] if after else 0
+        return conn.execute('''
+            SELECT seq, day, ts, payload FROM events
+            WHERE kind='duty_assigned' AND day BETWEEN ? AND ? AND seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (start, end, last_seq, CHUNK)).fetchall()
+
+    def render(row):
+        seq, day, ts, payload = row
+        data = json.loads(payload)
+        return {"date": day, "assigned_at": ts, "name": data["name"],
+                "user_id": data["user_id"], "manual": data["manual"]}
+
+    return await _stream(request, fetch_page, render)
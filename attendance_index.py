@@ -0,0 +1,171 @@
+# attendance_index.py
+from datetime import date, datetime, timedelta
+
+
+# === БИТОВЫЙ ИНДЕКС ПОСЕЩАЕМОСТИ ===
+# На каждого ученика — две битовые строки: «отметился, что придёт» и
+# «не придёт». Бит номер N — это день base + N. Битовые строки хранятся
+# в целых числах Python (внутри это массив машинных слов), поэтому
+# AND / OR / popcount выполняются в C сразу над всеми днями.
+#
+# Класс из 30 человек за учебный год — около 3 КБ. Индекс загружается
+# из БД при первом обращении и дальше обновляется при каждой записи.
+
+def popcount(bits: int) -> int:
+    # int.bit_count() есть только с Python 3.10
+    return bin(bits).count("1")
+
+
+def _to_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class AttendanceIndex:
+    def __init__(self):
+        self.loaded = False
+        self.base = None
+        self.present = {}
+        self.absent = {}
+        self.weekdays = 0
+        self.weekdays_len = 0
+        self.weekdays_base = None
+
+    # --- Загрузка и обновление ---
+
+    def ensure_loaded(self, conn):
+        if self.loaded:
+            return
+        self.present.clear()
+        self.absent.clear()
+        self.base = None
+        row = conn.execute("SELECT MIN(date) FROM attendance").fetchone()
+        if row[0]:
+            self.base = _to_date(row[0])
+        for user_id, day, status in conn.execute("SELECT user_id, date, status FROM attendance"):
+            self._set(user_id, day, status)
+        self.loaded = True
+
+    def invalidate(self):
+        # Следующее обращение перечитает всё из БД
+        self.loaded = False
+
+    def apply(self, user_id: int, days: list, status: str):
+        # До загрузки ничего не делаем: загрузка и так прочитает свежие данные
+        if not self.loaded:
+            return
+        for day in days:
+            self._set(user_id, day, status)
+
+    def remove_user(self, user_id: int):
+        self.present.pop(user_id, None)
+        self.absent.pop(user_id, None)
+
+    def clear(self):
+        self.present.clear()
+        self.absent.clear()
+
+    def _set(self, user_id: int, day, status: str):
+        bit = 1 << self._bit(_to_date(day))
+        present = self.present.get(user_id, 0)
+        absent = self.absent.get(user_id, 0)
+        if status == "present":
+            present |= bit
+            absent &= ~bit
+        else:
+            absent |= bit
+            present &= ~bit
+        self.present[user_id] = present
+        self.absent[user_id] = absent
+
+    def _bit(self, day: date) -> int:
+        if self.base is None:
+            self.base = day
+        if day < self.base:
+            # Редкий случай: дата раньше начала — сдвигаем все строки
+            shift = (self.base - day).days
+            for bits in (self.present, self.absent):
+                for user_id in bits:
+                    bits[user_id] <<= shift
+            self.base = day
+        return (day - self.base).days
+
+    # --- Маски ---
+
+    def school_days_mask(self, start, end) -> int:
+        # Биты учебных дней (пн–пт) в диапазоне [start, end]
+        start, end = _to_date(start), _to_date(end)
+        if self.base is None or end < self.base or end < start:
+            return 0
+        low = max((start - self.base).days, 0)
+        high = (end - self.base).days
+        span = ((1 << (high - low + 1)) - 1) << low
+        return span & self._weekday_mask(high + 1)
+
+    def _weekday_mask(self, length: int) -> int:
+        # Повторяющийся недельный шаблон «5 через 2», выровненный по base
+        if self.weekdays_base != self.base or self.weekdays_len < length:
+            week = sum(1 << i for i in range(7) if (self.base + timedelta(days=i)).weekday() < 5)
+            weeks = (length + 366) // 7 + 1
+            mask = 0
+            for w in range(weeks):
+                mask |= week << (7 * w)
+            self.weekdays = mask
+            self.weekdays_len = weeks * 7
+            self.weekdays_base = self.base
+        return self.weekdays
+
+    # --- Статистика ---
+
+    def absent_days(self, user_id: int, mask: int) -> int:
+        return popcount(self.absent.get(user_id, 0) & mask)
+
+    def absent_by_student(self, mask: int) -> dict:
+        return {user_id: popcount(bits & mask) for user_id, bits in self.absent.items()}
+
+    def days_anyone_absent(self, mask: int) -> int:
+        union = 0
+        for bits in self.absent.values():
+            union |= bits
+        return popcount(union & mask)
+
+    def _count_planes(self, mask: int) -> list:
+        # Побитовый (bit-sliced) счётчик: planes[k] — k-й разряд числа
+        # отсутствующих в каждый день. Строки всех учеников складываются
+        # как многоразрядные числа — по одной операции на разряд.
+        planes = []
+        for bits in self.absent.values():
+            carry = bits & mask
+            k = 0
+            while carry:
+                if k == len(planes):
+                    planes.append(0)
+                planes[k], carry = planes[k] ^ carry, planes[k] & carry
+                k += 1
+        return planes
+
+    def busiest_days(self, mask: int, limit: int = 5) -> list:
+        # Дни с наибольшим числом отсутствующих: максимум ищется сверху
+        # вниз по разрядам счётчика, сразу для всех дней
+        planes = self._count_planes(mask)
+        result = []
+        remaining = mask
+        while remaining and len(result) < limit:
+            candidates = remaining
+            count = 0
+            for k in reversed(range(len(planes))):
+                if candidates & planes[k]:
+                    candidates &= planes[k]
+                    count |= 1 << k
+            if count == 0:
+                break
+            remaining &= ~candidates
+            while candidates and len(result) < limit:
+                low = candidates & -candidates
+                result.append((self.base + timedelta(days=low.bit_length() - 1), count))
+                candidates ^= low
+        return result
+
+    def memory_bytes(self) -> int:
+        return sum((bits.bit_length() + 7) // 8 for store in (self.present, self.absent) for bits in store.values())
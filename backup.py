@@ -0,0 +1,92 @@
+# backup.py
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+
+# === ГОРЯЧИЕ РЕЗЕРВНЫЕ КОПИИ ===
+# Копия делается через online backup API SQLite из отдельного потока
+# и отдельного соединения: страницы копируются порциями, между порциями
+# бот продолжает писать в базу. Готовая копия проверяется integrity_check,
+# старые копии сверх BACKUP_KEEP удаляются.
+
+class BackupError(Exception):
+    pass
+
+
+def backup_now(db_path: str, backup_dir: str, keep: int, pages: int = 64, pause: float = 0.005) -> dict:
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    target_path = os.path.join(backup_dir, f"{stem}-{stamp}.db")
+    partial_path = target_path + ".part"
+
+    started = time.perf_counter()
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(partial_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=pause)
+            check = target.execute("PRAGMA integrity_check").fetchone()[0]
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+    except Exception:
+        # Недописанный .part ротация не видит — убираем сразу
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    if check != "ok":
+        os.remove(partial_path)
+        raise BackupError(f"integrity_check: {check}")
+    os.replace(partial_path, target_path)
+
+    removed = rotate(backup_dir, stem, keep)
+    return {
+        "path": target_path,
+        "size": os.path.getsize(target_path),
+        "pages": page_count,
+        "steps": steps,
+        "seconds": time.perf_counter() - started,
+        "removed": removed,
+    }
+
+
+def rotate(backup_dir: str, stem: str, keep: int) -> list:
+    snapshots = list_backups(backup_dir, stem)
+    removed = snapshots[keep:] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def list_backups(backup_dir: str, stem: str) -> list:
+    # Новые — первыми (имя содержит метку времени)
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [
+        name for name in os.listdir(backup_dir)
+        if name.startswith(stem + "-") and name.endswith(".db")
+    ]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def latest_backup_time(backup_dir: str, stem: str):
+    # Время последней копии (mtime) или None, если копий нет
+    snapshots = list_backups(backup_dir, stem)
+    return os.path.getmtime(snapshots[0]) if snapshots else None
+
+
+async def backup_async(db_path: str, backup_dir: str, keep: int) -> dict:
+    # Копирование идёт в отдельном потоке — обработчики не ждут
+    return await asyncio.to_thread(backup_now, db_path, backup_dir, keep)
@@ -0,0 +1,89 @@
+# bench_write_queue.py
+# Замер: утренний «всплеск» нажатий «✅ Приду в школу».
+# Сравниваем старый способ (commit на каждую строку) и WriteQueue.
+#
+#   python bench_write_queue.py --students 30 --rounds 5
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from write_queue import WriteQueue
+
+UPSERT = "INSERT OR REPLACE INTO attendance (user_id, date, status, reason) VALUES (?, ?, ?, ?)"
+
+
+def make_db(path: str):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            user_id INTEGER,
+            date TEXT,
+            status TEXT,
+            reason TEXT,
+            PRIMARY KEY (user_id, date)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+
+def month_rows(user_id: int, days: int):
+    return [(user_id, f"2024-09-{day:02d}", "present", None) for day in range(1, days + 1)]
+
+
+async def burst_direct(conn, students: int, days: int):
+    # Как было: каждый обработчик пишет и коммитит строку за строкой
+    async def tap(user_id):
+        await asyncio.sleep(0)
+        for row in month_rows(user_id, days):
+            conn.execute(UPSERT, row)
+            conn.commit()
+
+    await asyncio.gather(*(tap(uid) for uid in range(students)))
+
+
+async def burst_queued(queue, students: int, days: int):
+    async def tap(user_id):
+        await asyncio.sleep(0)
+        await queue.submit(UPSERT, month_rows(user_id, days))
+
+    await asyncio.gather(*(tap(uid) for uid in range(students)))
+
+
+async def run(students: int, days: int, rounds: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = make_db(os.path.join(tmp, "direct.db"))
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await burst_direct(conn, students, days)
+        direct = time.perf_counter() - started
+        conn.close()
+
+        conn = make_db(os.path.join(tmp, "queued.db"))
+        queue = WriteQueue(conn)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await burst_queued(queue, students, days)
+        queued = time.perf_counter() - started
+        await queue.stop()
+        conn.close()
+
+    taps = students * rounds
+    rows = taps * days
+    print(f"Нажатий: {taps}, строк: {rows}")
+    print(f"commit на строку: {direct:.3f} с, {taps / direct:.0f} нажатий/с, {rows / direct:.0f} строк/с")
+    print(f"WriteQueue:       {queued:.3f} с, {taps / queued:.0f} нажатий/с, {rows / queued:.0f} строк/с")
+    print(f"Транзакций: {queue.stats['batches']} (макс. пачка {queue.stats['max_batch_seen']}), "
+          f"ускорение x{direct / queued:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.students, args.days, args.rounds))
@@ -0,0 +1,18 @@
+# clock.py
+import asyncio
+from datetime import datetime
+
+
+# === ЧАСЫ ===
+# Всё, что зависит от времени, спрашивает его здесь.
+# В режиме симуляции (simulation.py) main.clock подменяется на виртуальные часы.
+
+class RealClock:
+    def now(self) -> datetime:
+        return datetime.now()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+clock = RealClock()
@@ -3,3 +3,10 @@ BOT_TOKEN = "8358402394:AAFsp3-PPZB5-HixEWLm8wXlARHNszxj7LA"           # ← з
 TEACHER_ID = 1407739698            # ← ваш ID
 TEACHER_TIMEZONE_OFFSET = 5            # ← ваш UTC
 CHANNEL_ID = "@testi_bjtjv"     # ← канал
+DB_PATH = "school_bot.db"              # ← файл базы данных
+BACKUP_DIR = "backups"                 # ← папка для резервных копий
+BACKUP_KEEP = 7                        # ← сколько копий хранить
+BACKUP_INTERVAL_HOURS = 24             # ← как часто делать копию
+API_ENABLED = False                    # ← HTTP API только для чтения (для дашбордов)
+API_HOST = "127.0.0.1"
+API_PORT = 8080
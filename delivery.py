@@ -0,0 +1,280 @@
+# delivery.py
+import asyncio
+import json
+import random
+import time
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+
+# === ИСХОДЯЩАЯ ДОСТАВКА ===
+# Все отправки планировщика идут через Delivery:
+# - одна общая keep-alive сессия с явными таймаутами;
+# - повтор с экспоненциальной задержкой и джиттером (для идемпотентных
+#   отправок — при любой временной ошибке, для прочих — только на
+#   RetryAfter, когда Telegram точно ничего не отправил);
+# - автомат-предохранитель на каждый чат: после нескольких неудач подряд
+#   чат «закрывается» на время, отправки в него сразу идут в очередь;
+# - очередь недоставленных (dead letters) в БД, которую фоново
+#   повторяет run_dead_letters(). Письмо помнит, можно ли его повторять
+#   безопасно (idempotent), к какому дню оно относится (day — на другой
+#   день не отправляется) и метку tag для on_redelivered.
+#   Неидемпотентная отправка, оборвавшаяся по сети или таймауту, в
+#   очередь не ставится: Telegram мог её уже опубликовать, и повтор
+#   дал бы второй пост. Решать, повторять ли, — человеку.
+
+# Редактировать нечего — сообщение удалено или слишком старое
+MESSAGE_GONE = ("message to edit not found", "message can't be edited")
+# Ошибки запроса, которые говорят о недоступности самого чата, а не об
+# одном неудачном сообщении (разметка, удалённый пост)
+CHAT_UNREACHABLE = ("chat not found", "not enough rights", "need administrator rights")
+
+def make_session(timeout: float = 15, limit: int = 20, keepalive: float = 60) -> AiohttpSession:
+    session = AiohttpSession(limit=limit, timeout=timeout)
+    # Держим соединения с api.telegram.org открытыми между отправками
+    session._connector_init["keepalive_timeout"] = keepalive
+    return session
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = 3, cooldown: float = 300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = {}
+        self.opened_at = {}
+
+    def allow(self, chat_id) -> bool:
+        opened = self.opened_at.get(chat_id)
+        if opened is None:
+            return True
+        # По истечении паузы пропускаем пробную отправку
+        return time.monotonic() - opened >= self.cooldown
+
+    def success(self, chat_id):
+        self.failures.pop(chat_id, None)
+        self.opened_at.pop(chat_id, None)
+
+    def failure(self, chat_id):
+        self.failures[chat_id] = self.failures.get(chat_id, 0) + 1
+        if self.failures[chat_id] >= self.threshold:
+            self.opened_at[chat_id] = time.monotonic()
+
+    def open_chats(self) -> list:
+        return [chat_id for chat_id in self.opened_at if not self.allow(chat_id)]
+
+
+class Delivery:
+    def __init__(self, get_bot, conn, today=None, attempts: int = 4, base_delay: float = 0.5, max_delay: float = 10,
+                 max_redeliveries: int = 20, max_age: float = 24 * 3600):
+        # get_bot — функция, чтобы симуляция могла подменить main.bot;
+        # today() -> "ГГГГ-ММ-ДД" — по нему устаревают письма с day
+        self.get_bot = get_bot
+        self.conn = conn
+        self.today = today
+        self.max_age = max_age
+        # on_redelivered(tag, day, result) — вызывается после доставки письма с меткой
+        self.on_redelivered = None
+        # Повтор очереди из /delivery и из фоновой задачи не должен идти
+        # одновременно: оба выбрали бы одни и те же письма
+        self.retry_lock = asyncio.Lock()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_redeliveries = max_redeliveries
+        self.breaker = CircuitBreaker()
+        self.stats = {"sent": 0, "retries": 0, "failed": 0, "short_circuited": 0, "dead_letters": 0, "redelivered": 0,
+                      "uncertain": 0}
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                method TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                created REAL NOT NULL,
+                idempotent INTEGER DEFAULT 0,
+                tag TEXT,
+                day TEXT
+            )
+        ''')
+        # Таблица из прошлой версии — добавляем новые столбцы
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(dead_letters)")}
+        for column, kind in (("idempotent", "INTEGER DEFAULT 0"), ("tag", "TEXT"), ("day", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE dead_letters ADD COLUMN {column} {kind}")
+        conn.commit()
+
+    # --- Отправка ---
+
+    async def send(self, chat_id, text: str, idempotent: bool = False, tag: str = None, day: str = None, **kwargs):
+        # Возвращает отправленное сообщение или None — тогда оно в очереди
+        # недоставленных, кроме неидемпотентной отправки с неясным исходом
+        letter = {"idempotent": idempotent, "tag": tag, "day": day}
+        return await self._deliver("send_message", chat_id, {"text": text, **kwargs}, idempotent, letter)
+
+    async def edit(self, chat_id, message_id: int, text: str, tag: str = None, day: str = None, **kwargs):
+        # Редактирование идемпотентно — повторять можно всегда.
+        # False — сообщения больше нет, в очередь ничего не поставлено
+        payload = {"message_id": message_id, "text": text, **kwargs}
+        return await self._deliver("edit_message_text", chat_id, payload, True,
+                                   {"idempotent": True, "tag": tag, "day": day})
+
+    async def _deliver(self, method: str, chat_id, payload: dict, idempotent: bool, letter: dict = None):
+        # letter — параметры письма для очереди; None — в очередь не ставить
+        try:
+            result = await self._call(method, chat_id, payload, idempotent)
+        except Exception as e:
+            outcome = self._failure(method, chat_id, idempotent, e)
+            if outcome == "uncertain":
+                # Не в очереди: вызывающий проверит queued() и предупредит
+                return None
+            if outcome is not None:
+                return outcome
+            # Бот не админ, чат не найден, сеть — ставим в очередь:
+            # после исправления настроек письмо уйдёт само
+            if letter is not None:
+                self.dead_letter(method, chat_id, payload, e, **letter)
+            return None
+        self.stats["sent"] += 1
+        return result
+
+    def _failure(self, method: str, chat_id, idempotent: bool, error: Exception):
+        # True/False — исход известен и очередь не нужна (правка без изменений /
+        # сообщения больше нет); "uncertain" — могло уйти, повторять нельзя;
+        # None — не отправлено, можно ставить в очередь
+        if method == "edit_message_text" and isinstance(error, TelegramBadRequest):
+            if "message is not modified" in str(error):
+                return True
+            if any(marker in str(error) for marker in MESSAGE_GONE):
+                print(f"[Доставка] {method} → {chat_id}: {error}")
+                return False
+        print(f"[Доставка] {method} → {chat_id}: {error}")
+        self.stats["failed"] += 1
+        if not idempotent and isinstance(error, (TelegramNetworkError, asyncio.TimeoutError)):
+            self.stats["uncertain"] += 1
+            return "uncertain"
+        return None
+
+    async def _call(self, method: str, chat_id, payload: dict, idempotent: bool):
+        if not self.breaker.allow(chat_id):
+            self.stats["short_circuited"] += 1
+            raise CircuitOpen(f"чат {chat_id} недоступен, отправка отложена")
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await getattr(self.get_bot(), method)(chat_id=chat_id, **payload)
+            except TelegramRetryAfter as e:
+                # Telegram сам сказал, сколько ждать, и ничего не отправил
+                if attempt >= self.attempts:
+                    raise
+                delay = e.retry_after
+            except TelegramForbiddenError:
+                # Бот заблокирован или исключён — чат недоступен
+                self.breaker.failure(chat_id)
+                raise
+            except TelegramBadRequest as e:
+                # Повтор не поможет. Предохранитель считает только ошибки
+                # самого чата, а не плохую разметку или удалённый пост
+                if any(marker in str(e) for marker in CHAT_UNREACHABLE):
+                    self.breaker.failure(chat_id)
+                raise
+            except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError):
+                if not idempotent or attempt >= self.attempts:
+                    self.breaker.failure(chat_id)
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self.breaker.success(chat_id)
+                return result
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # «Полный джиттер»: случайная пауза до base * 2^attempt
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # --- Очередь недоставленных ---
+
+    def dead_letter(self, method: str, chat_id, payload: dict, error: Exception,
+                    idempotent: bool = False, tag: str = None, day: str = None):
+        # Клавиатуры не сериализуем — сохраняем только текст и разметку
+        kept = {key: value for key, value in payload.items() if key in ("text", "parse_mode", "message_id")}
+        self.conn.execute(
+            "INSERT INTO dead_letters (chat_id, method, payload, error, created, idempotent, tag, day) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(chat_id), method, json.dumps(kept, ensure_ascii=False), str(error), time.time(),
+             int(idempotent), tag, day)
+        )
+        self.conn.commit()
+        self.stats["dead_letters"] += 1
+
+    def pending(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def queued(self, tag: str, day: str) -> bool:
+        # Есть ли в очереди письмо с такой меткой за этот день
+        row = self.conn.execute("SELECT 1 FROM dead_letters WHERE tag=? AND day=? LIMIT 1", (tag, day)).fetchone()
+        return row is not None
+
+    async def retry_dead_letters(self, limit: int = 50) -> int:
+        async with self.retry_lock:
+            return await self._retry_dead_letters(limit)
+
+    async def _retry_dead_letters(self, limit: int) -> int:
+        # Безнадёжные и устаревшие письма не копим: вчерашнее «Дежурит: X»
+        # сегодня уже вредно
+        today = self.today() if self.today else ""
+        self.conn.execute(
+            "DELETE FROM dead_letters WHERE attempts >= ? OR created < ? OR (day IS NOT NULL AND day < ?)",
+            (self.max_redeliveries, time.time() - self.max_age, today)
+        )
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT id, chat_id, method, payload, idempotent, tag, day FROM dead_letters ORDER BY id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        delivered = 0
+        for letter_id, chat_id, method, payload, idempotent, tag, day in rows:
+            chat = int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id
+            if not self.breaker.allow(chat):
+                continue
+            try:
+                result = await self._call(method, chat, json.loads(payload), bool(idempotent))
+            except Exception as e:
+                outcome = self._failure(method, chat, bool(idempotent), e)
+                if outcome is None:
+                    self.conn.execute("UPDATE dead_letters SET attempts = attempts + 1 WHERE id=?", (letter_id,))
+                else:
+                    # Исход известен или повтор небезопасен — письмо больше не трогаем
+                    self.conn.execute("DELETE FROM dead_letters WHERE id=?", (letter_id,))
+            else:
+                self.stats["sent"] += 1
+                self.conn.execute("DELETE FROM dead_letters WHERE id=?", (letter_id,))
+                delivered += 1
+                if tag and self.on_redelivered:
+                    self.on_redelivered(tag, day, result)
+            self.conn.commit()
+        self.stats["redelivered"] += delivered
+        return delivered
+
+    async def run_dead_letters(self, interval: float = 300):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.retry_dead_letters()
+            except Exception as e:
+                print(f"[Доставка] Ошибка повтора очереди: {e}")
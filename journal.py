@@ -0,0 +1,242 @@
+# journal.py
+import json
+import sqlite3
+import sys
+import time
+
+
+# === ЖУРНАЛ СОБЫТИЙ ===
+# Таблицы users / duty_roster / attendance перезаписываются на месте,
+# поэтому каждое изменение дополнительно пишется в журнал (только INSERT).
+# Из журнала можно заново собрать таблицы и узнать состояние на любой момент.
+# Чтобы не проигрывать журнал с самого начала, периодически сохраняются
+# контрольные точки — полный снимок состояния на номер события.
+#
+# Запись в журнал — один INSERT без COMMIT: он попадает в ту же
+# транзакцию, что и само изменение.
+
+CHECKPOINT_EVERY = 1000
+
+INSERT_EVENT = "INSERT INTO events (ts, kind, day, payload) VALUES (?, ?, ?, ?)"
+
+
+class Journal:
+    def __init__(self, conn, now):
+        self.conn = conn
+        self.now = now
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                day TEXT,
+                payload TEXT NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS events_kind_day ON events (kind, day)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                seq INTEGER PRIMARY KEY,
+                ts TEXT NOT NULL,
+                state TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        # Версия данных для ETag/Last-Modified (api.py); растёт при каждом изменении
+        self.version = 0
+        self.last_modified = time.time()
+        if conn.execute("SELECT 1 FROM checkpoints LIMIT 1").fetchone() is None:
+            # Всё, что было в БД до появления журнала, — нулевая точка
+            self.checkpoint()
+
+    # --- Запись ---
+
+    def event_row(self, kind: str, day: str = None, **payload):
+        return (self.now().isoformat(sep=" "), kind, day, json.dumps(payload, ensure_ascii=False))
+
+    def record(self, kind: str, day: str = None, **payload):
+        self.conn.execute(INSERT_EVENT, self.event_row(kind, day, **payload))
+        self.touch()
+
+    def touch(self):
+        # Для записей через очередь вызывается после COMMIT
+        self.version += 1
+        self.last_modified = time.time()
+
+    def maybe_checkpoint(self):
+        # Сколько событий после последней точки — считаем по БД, а не в
+        # памяти: иначе при частых перезапусках счётчик не доходит до порога
+        backlog = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) - (SELECT COALESCE(MAX(seq), 0) FROM checkpoints) FROM events"
+        ).fetchone()[0]
+        if backlog >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def checkpoint(self):
+        state = load_tables(self.conn)
+        row = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (seq, ts, state) VALUES (?, ?, ?)",
+            (row[0], self.now().isoformat(sep=" "), dump_state(state))
+        )
+        self.conn.commit()
+
+    # --- Проигрывание ---
+
+    def state_at(self, ts: str = None) -> dict:
+        # Состояние после последнего события с меткой времени <= ts (None — сейчас)
+        if ts is None:
+            checkpoint = self.conn.execute(
+                "SELECT seq, state FROM checkpoints ORDER BY seq DESC LIMIT 1"
+            ).fetchone()
+        else:
+            checkpoint = self.conn.execute(
+                "SELECT seq, state FROM checkpoints WHERE ts <= ? ORDER BY seq DESC LIMIT 1", (ts,)
+            ).fetchone()
+            if checkpoint is None:
+                checkpoint = self.conn.execute(
+                    "SELECT seq, state FROM checkpoints ORDER BY seq ASC LIMIT 1"
+                ).fetchone()
+        seq, raw = checkpoint
+        state = load_state(raw)
+
+        if ts is None:
+            rows = self.conn.execute(
+                "SELECT kind, day, payload FROM events WHERE seq > ? ORDER BY seq", (seq,)
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT kind, day, payload FROM events WHERE seq > ? AND ts <= ? ORDER BY seq", (seq, ts)
+            )
+        for kind, day, payload in rows:
+            apply_event(state, kind, day, json.loads(payload))
+        return state
+
+    def rebuild(self):
+        # Пересобирает users / duty_roster / attendance из журнала
+        state = self.state_at()
+        with self.conn:
+            self.conn.execute("DELETE FROM users")
+            self.conn.execute("DELETE FROM duty_roster")
+            self.conn.execute("DELETE FROM attendance")
+            self.conn.executemany(
+                "INSERT INTO users (user_id, name, role, approved) VALUES (?, ?, ?, ?)",
+                [(uid, u["name"], u["role"], u["approved"]) for uid, u in state["users"].items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO duty_roster (name) VALUES (?)", [(name,) for name in state["roster"]]
+            )
+            self.conn.executemany(
+                "INSERT INTO attendance (user_id, date, status, reason) VALUES (?, ?, ?, ?)",
+                [(uid, date, status, reason) for (uid, date), (status, reason) in state["attendance"].items()]
+            )
+        self.touch()
+        return state
+
+    def verify(self) -> bool:
+        return self.state_at() == load_tables(self.conn)
+
+    # --- Запросы на момент времени ---
+
+    def duty_on(self, day: str):
+        row = self.conn.execute(
+            "SELECT payload FROM events WHERE kind='duty_assigned' AND day=? ORDER BY seq DESC LIMIT 1",
+            (day,)
+        ).fetchone()
+        return json.loads(row[0])["name"] if row else None
+
+    def events_on(self, day: str):
+        rows = self.conn.execute(
+            "SELECT ts, kind, payload FROM events WHERE ts >= ? AND ts < ? ORDER BY seq",
+            (day, day + "~")
+        )
+        return [(ts, kind, json.loads(payload)) for ts, kind, payload in rows]
+
+
+# === СОСТОЯНИЕ ===
+# {"users": {user_id: {name, role, approved}}, "roster": [name, ...],
+#  "attendance": {(user_id, date): (status, reason)}}
+
+def load_tables(conn) -> dict:
+    users = {
+        uid: {"name": name, "role": role, "approved": approved}
+        for uid, name, role, approved in conn.execute("SELECT user_id, name, role, approved FROM users")
+    }
+    roster = [row[0] for row in conn.execute("SELECT name FROM duty_roster ORDER BY id ASC")]
+    attendance = {
+        (uid, date): (status, reason)
+        for uid, date, status, reason in conn.execute("SELECT user_id, date, status, reason FROM attendance")
+    }
+    return {"users": users, "roster": roster, "attendance": attendance}
+
+
+def dump_state(state: dict) -> str:
+    return json.dumps({
+        "users": [[uid, u["name"], u["role"], u["approved"]] for uid, u in state["users"].items()],
+        "roster": state["roster"],
+        "attendance": [[uid, date, status, reason] for (uid, date), (status, reason) in state["attendance"].items()],
+    }, ensure_ascii=False)
+
+
+def load_state(raw: str) -> dict:
+    data = json.loads(raw)
+    return {
+        "users": {uid: {"name": name, "role": role, "approved": approved} for uid, name, role, approved in data["users"]},
+        "roster": data["roster"],
+        "attendance": {(uid, date): (status, reason) for uid, date, status, reason in data["attendance"]},
+    }
+
+
+def apply_event(state: dict, kind: str, day: str, p: dict):
+    users, roster, attendance = state["users"], state["roster"], state["attendance"]
+    if kind == "user_registered":
+        if p.get("replace", True) or p["user_id"] not in users:
+            users[p["user_id"]] = {"name": p["name"], "role": p["role"], "approved": p["approved"]}
+    elif kind == "user_approved":
+        if p["user_id"] in users:
+            users[p["user_id"]]["approved"] = 1
+    elif kind == "user_removed":
+        users.pop(p["user_id"], None)
+    elif kind == "student_deleted":
+        # Из очереди ученика убирает отдельное событие roster_removed
+        for uid in [uid for uid, u in users.items() if u["name"] == p["name"] and u["role"] == "student"]:
+            del users[uid]
+        for key in [key for key in attendance if key[0] == p["user_id"]]:
+            del attendance[key]
+    elif kind == "all_students_deleted":
+        for uid in [uid for uid, u in users.items() if u["role"] == "student"]:
+            del users[uid]
+        attendance.clear()
+    elif kind == "attendance_set":
+        for date in p["dates"]:
+            attendance[(p["user_id"], date)] = (p["status"], p["reason"])
+    elif kind == "roster_added":
+        roster.append(p["name"])
+    elif kind == "roster_removed":
+        roster[:] = [name for name in roster if name != p["name"]]
+    elif kind == "roster_popped":
+        if roster:
+            roster.pop(0)
+    elif kind == "roster_cleared":
+        roster.clear()
+    # duty_assigned / duty_reported состояние таблиц не меняют
+
+
+# Проверка и пересборка без запуска бота:
+#   python journal.py verify
+#   python journal.py rebuild
+if __name__ == "__main__":
+    from datetime import datetime
+
+    import config
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    conn = sqlite3.connect(getattr(config, "DB_PATH", "school_bot.db"))
+    journal = Journal(conn, datetime.now)
+    if command == "rebuild":
+        state = journal.rebuild()
+        print(f"✅ Пересобрано: {len(state['users'])} пользователей, "
+              f"{len(state['roster'])} в очереди, {len(state['attendance'])} отметок")
+    else:
+        print("✅ Журнал совпадает с таблицами" if journal.verify() else "❌ Журнал расходится с таблицами")
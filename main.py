@@ -1,14 +1,29 @@
 # main.py
 import asyncio
+import json
+import os
 import sqlite3
 import re
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, FSInputFile
+
+from attendance_index import AttendanceIndex, popcount
+from backup import backup_async, latest_backup_time
+from clock import clock
+from delivery import Delivery, make_session
+from journal import Journal, INSERT_EVENT
+from pager import PageCache, page_kb, parse_page_data
+from profiler import UpdateProfiler
+from throttling import ThrottlingMiddleware
+from write_queue import WriteQueue
 
 # === НАСТРОЙКИ ИЗ config.py ===
 import config
@@ -17,9 +32,16 @@ BOT_TOKEN = config.BOT_TOKEN
 TEACHER_ID = config.TEACHER_ID
 CHANNEL_ID = config.CHANNEL_ID
 TEACHER_TIMEZONE_OFFSET = config.TEACHER_TIMEZONE_OFFSET
+DB_PATH = getattr(config, "DB_PATH", "school_bot.db")
+BACKUP_DIR = getattr(config, "BACKUP_DIR", "backups")
+BACKUP_KEEP = getattr(config, "BACKUP_KEEP", 7)
+BACKUP_INTERVAL_HOURS = getattr(config, "BACKUP_INTERVAL_HOURS", 24)
+API_ENABLED = getattr(config, "API_ENABLED", False)
+API_HOST = getattr(config, "API_HOST", "127.0.0.1")
+API_PORT = getattr(config, "API_PORT", 8080)
 
 # === БОТ И ДИСПЕТЧЕР ===
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=make_session())
 dp = Dispatcher()
 
 # === СОСТОЯНИЕ БОТА ===
@@ -29,7 +51,7 @@ bot_active = True
 current_channel = CHANNEL_ID
 
 # === БАЗА ДАННЫХ ===
-conn = sqlite3.connect("school_bot.db", check_same_thread=False)
+conn = sqlite3.connect(DB_PATH, check_same_thread=False)
 cursor = conn.cursor()
 
 # === Таблицы ===
@@ -73,10 +95,59 @@ cursor.execute('''
     )
 ''')
 
+cursor.execute('''
+    CREATE TABLE IF NOT EXISTS duty_runs (
+        day TEXT PRIMARY KEY,
+        duty_name TEXT,
+        user_id INTEGER,
+        message_id INTEGER,
+        present TEXT,
+        absent TEXT,
+        channel_text TEXT,
+        report TEXT,
+        created TEXT
+    )
+''')
+
+# Выборки по диапазону дат (HTTP API) — без полного прохода по таблице
+cursor.execute("CREATE INDEX IF NOT EXISTS attendance_by_date ON attendance (date, user_id)")
+
+# Постраничные списки идут по ключу (имя, user_id)
+cursor.execute("CREATE INDEX IF NOT EXISTS users_by_name ON users (name, user_id)")
+
 # Инициализация канала по умолчанию
 cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('channel', ?)", (CHANNEL_ID,))
 conn.commit()
 
+# === ЖУРНАЛ СОБЫТИЙ ===
+journal = Journal(conn, lambda: clock.now())
+
+# === ОЧЕРЕДЬ ЗАПИСИ ПОСЕЩАЕМОСТИ ===
+# Утром почти весь класс жмёт кнопки одновременно — пишем пачками
+attendance_queue = WriteQueue(conn)
+
+# Битовый индекс для статистики (/absences), грузится при первом обращении
+attendance_index = AttendanceIndex()
+
+# Счётчики пропущенных записей: состояние уже такое, писать нечего
+attendance_stats = {"suppressed_writes": 0, "suppressed_rows": 0}
+attendance_locks = defaultdict(asyncio.Lock)
+
+# === АНТИДРЕБЕЗГ: повторные нажатия одной кнопки схлопываются ===
+throttling = ThrottlingMiddleware()
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+
+# === ИСХОДЯЩАЯ ДОСТАВКА: повторы, предохранитель, очередь недоставленных ===
+delivery = Delivery(lambda: bot, conn, today=lambda: clock.now().strftime("%Y-%m-%d"))
+
+# === ПОСТРАНИЧНЫЕ ОТЧЁТЫ: готовые страницы живут минуту ===
+page_cache = PageCache()
+PAGE_SIZE = 20
+
+# === ПРОФИЛИРОВАНИЕ (/profile) ===
+profiler = UpdateProfiler(dp, conn)
+
 # === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
 
 def get_duty_list():
@@ -84,27 +155,31 @@ def get_duty_list():
     return [row[0] for row in cursor.fetchall()]
 
 def add_to_duty_roster(name: str):
+    journal.record("roster_added", name=name)
     cursor.execute("INSERT INTO duty_roster (name) VALUES (?)", (name,))
     conn.commit()
 
 def remove_from_duty_roster(name: str):
+    journal.record("roster_removed", name=name)
     cursor.execute("DELETE FROM duty_roster WHERE name=?", (name,))
     conn.commit()
 
 def clear_duty_roster():
+    journal.record("roster_cleared")
     cursor.execute("DELETE FROM duty_roster")
     conn.commit()
 
-def remove_first_from_duty():
-    names = get_duty_list()
-    if not names:
-        return None
-    first = names[0]
-    cursor.execute("DELETE FROM duty_roster WHERE rowid IN (SELECT rowid FROM duty_roster LIMIT 1)")
+def add_to_end_of_duty(name: str):
+    journal.record("roster_added", name=name)
+    cursor.execute("INSERT INTO duty_roster (name) VALUES (?)", (name,))
     conn.commit()
-    return first
 
-def add_to_end_of_duty(name: str):
+def move_to_end_of_duty(name: str):
+    # Назначенный ученик уходит в конец очереди — ровно одной записью,
+    # даже если не отчитается. Удаление и вставка — одной транзакцией.
+    journal.record("roster_removed", name=name)
+    journal.record("roster_added", name=name)
+    cursor.execute("DELETE FROM duty_roster WHERE name=?", (name,))
     cursor.execute("INSERT INTO duty_roster (name) VALUES (?)", (name,))
     conn.commit()
 
@@ -126,10 +201,63 @@ def load_setting(key: str, default: str):
     row = cursor.fetchone()
     return row[0] if row else default
 
+# === Итоги дня (дежурство + отчёт) ===
+DUTY_RUN_FIELDS = ("day", "duty_name", "user_id", "message_id", "present", "absent", "channel_text", "report", "created")
+
+def save_duty_run(day: str, duty_name, user_id, present: list, absent: list, channel_text, report: str):
+    # Без COMMIT — сохраняется вместе с остальными изменениями назначения
+    cursor.execute(
+        "INSERT OR REPLACE INTO duty_runs (day, duty_name, user_id, message_id, present, absent, channel_text, report, created) "
+        "VALUES (?, ?, ?, NULL, ?, ?, ?, ?, ?)",
+        (day, duty_name, user_id, json.dumps(present, ensure_ascii=False), json.dumps(absent, ensure_ascii=False),
+         channel_text, report, clock.now().isoformat(sep=" "))
+    )
+
+def remember_duty_post(tag: str, day: str, message):
+    # Пост о дежурстве ушёл (сразу или из очереди недоставленных) — дальше
+    # отчёт и повтор правят именно его
+    if tag != "duty_post":
+        return
+    run = load_duty_run(day)
+    if run:
+        update_duty_run(day, message_id=message.message_id)
+    if not run or run["duty_name"]:
+        save_duty_message_id(message.message_id)
+
+def channel_failure_notice(day: str) -> str:
+    # Пост о дежурстве не подтверждён: либо он в очереди недоставленных,
+    # либо канал не ответил и пост мог выйти — тогда повтор за учителем
+    if delivery.queued("duty_post", day) or delivery.queued("duty_edit", day):
+        return "❌ Ошибка в канале: сообщение отложено для повторной отправки."
+    return ("⚠️ Канал не ответил — пост мог и не выйти. Проверьте канал; "
+            "если поста нет, нажмите «📤 Повторить отчёт в канал».")
+
+def update_duty_run(day: str, **fields):
+    for key in fields:
+        # Имена столбцов подставляются в SQL — только из известного списка
+        if key not in DUTY_RUN_FIELDS:
+            raise ValueError(f"Неизвестное поле duty_runs: {key}")
+    assignments = ", ".join(f"{key}=?" for key in fields)
+    cursor.execute(f"UPDATE duty_runs SET {assignments} WHERE day=?", (*fields.values(), day))
+    conn.commit()
+
+def load_duty_run(day: str):
+    cursor.execute(f"SELECT {', '.join(DUTY_RUN_FIELDS)} FROM duty_runs WHERE day=?", (day,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    run = dict(zip(DUTY_RUN_FIELDS, row))
+    run["present"] = json.loads(run["present"])
+    run["absent"] = json.loads(run["absent"])
+    return run
+
 # === Посещаемость ===
-def get_dates_in_month():
-    today = datetime.now()
-    year, month = today.year, today.month
+def get_dates_in_month(month_str: str = None):
+    if month_str:
+        year, month = int(month_str[:4]), int(month_str[5:7])
+    else:
+        today = clock.now()
+        year, month = today.year, today.month
     current = datetime(year, month, 1)
     dates = []
     while current.month == month:
@@ -137,49 +265,56 @@ def get_dates_in_month():
         current += timedelta(days=1)
     return dates
 
-def update_attendance(user_id: int, date: str, status: str, reason: str = None):
-    cursor.execute('''
-        INSERT OR REPLACE INTO attendance (user_id, date, status, reason)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, date, status, reason))
-    conn.commit()
-
-def get_attendance_for_user(user_id: int):
-    dates = get_dates_in_month()
-    attendance = {}
-    for date in dates:
-        cursor.execute(
-            "SELECT status, reason FROM attendance WHERE user_id=? AND date=?",
-            (user_id, date)
-        )
-        row = cursor.fetchone()
-        if row:
-            attendance[date] = row
-        else:
-            attendance[date] = ("present", None)
-    return attendance
+ATTENDANCE_UPSERT = '''
+    INSERT OR REPLACE INTO attendance (user_id, date, status, reason)
+    VALUES (?, ?, ?, ?)
+'''
 
-def set_absent_from_date(user_id: int, start_date: str, reason: str):
+def attendance_rows_from(user_id: int, start_date: str, status: str, reason: str = None):
     dates = get_dates_in_month()
     try:
         start_index = dates.index(start_date)
     except ValueError:
         start_index = 0
-    for date in dates[start_index:]:
-        update_attendance(user_id, date, "absent", reason)
+    return [(user_id, date, status, reason) for date in dates[start_index:]]
 
-def clear_future_absent_from(user_id: int, start_date: str):
-    dates = get_dates_in_month()
-    try:
-        start_index = dates.index(start_date)
-    except ValueError:
-        start_index = 0
-    for date in dates[start_index:]:
-        update_attendance(user_id, date, "present", None)
+async def write_attendance(user_id: int, rows: list):
+    if not rows:
+        return
+    # Записи одного ученика идут строго по очереди: иначе сравнение ниже
+    # увидит БД без его же записи, которая ещё ждёт в attendance_queue
+    async with attendance_locks[user_id]:
+        await _write_attendance(user_id, rows)
+
+async def _write_attendance(user_id: int, rows: list):
+    # Пишем только то, что действительно меняется
+    cursor.execute(
+        "SELECT date, status, reason FROM attendance WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, rows[0][1], rows[-1][1])
+    )
+    current = {date: (status, reason) for date, status, reason in cursor.fetchall()}
+    changed = [row for row in rows if current.get(row[1]) != (row[2], row[3])]
+    attendance_stats["suppressed_rows"] += len(rows) - len(changed)
+    if not changed:
+        attendance_stats["suppressed_writes"] += 1
+        return
+
+    _, _, status, reason = changed[0]
+    event = journal.event_row("attendance_set", user_id=user_id, status=status, reason=reason,
+                              dates=[row[1] for row in changed])
+    await attendance_queue.submit_many([(ATTENDANCE_UPSERT, changed), (INSERT_EVENT, [event])])
+    journal.touch()
+    attendance_index.apply(user_id, [row[1] for row in changed], status)
+
+async def set_absent_from_date(user_id: int, start_date: str, reason: str):
+    await write_attendance(user_id, attendance_rows_from(user_id, start_date, "absent", reason))
+
+async def clear_future_absent_from(user_id: int, start_date: str):
+    await write_attendance(user_id, attendance_rows_from(user_id, start_date, "present"))
 
 # === Проверка выходных ===
 def is_weekend():
-    return datetime.now().weekday() >= 5
+    return clock.now().weekday() >= 5
 
 # === СОСТОЯНИЯ FSM ===
 class Registration(StatesGroup):
@@ -233,16 +368,24 @@ def get_confirm_kb():
     ])
 
 # === Назначение дежурного в 8:25 + ОТЧЁТ УЧИТЕЛЮ ===
+async def send_to_teacher(*texts):
+    # Сообщения учителю — по порядку, но параллельно с каналом и дежурным
+    for text in texts:
+        await delivery.send(TEACHER_ID, text, idempotent=True, parse_mode="HTML")
+
 async def assign_daily_duty():
     if not bot_active or is_weekend():
         return
 
+    today_str = clock.now().strftime("%Y-%m-%d")
+    # За день назначаем один раз: повторный запуск ничего не меняет
+    if load_duty_run(today_str):
+        return
+
     save_setting("rotation_started", "true")
 
     roster = get_duty_list()
     if not roster:
-        await bot.send_message(TEACHER_ID, "⚠️ Список дежурных пуст.")
-        today_str = datetime.now().strftime("%Y-%m-%d")
         cursor.execute("SELECT name FROM users WHERE user_id IN (SELECT user_id FROM attendance WHERE date=? AND status='present') AND role='student' AND approved=1", (today_str,))
         present = [row[0] for row in cursor.fetchall()]
         cursor.execute("SELECT name, reason FROM users LEFT JOIN attendance ON users.user_id = attendance.user_id AND attendance.date=? WHERE attendance.status='absent' AND users.role='student' AND approved=1", (today_str,))
@@ -260,36 +403,35 @@ async def assign_daily_duty():
             report += "❌ Никто не отсутствует\n"
 
         report += "\n🧹 Дежурит: <b>Нет</b> (список пуст)"
-        try:
-            await bot.send_message(TEACHER_ID, report, parse_mode="HTML")
-        except Exception as e:
-            print(f"[Отчёт учителю] Ошибка: {e}")
+        save_duty_run(today_str, None, None, present, absent, None, report)
+        conn.commit()
+        await send_to_teacher("⚠️ Список дежурных пуст.", report)
         return
 
-    today_str = datetime.now().strftime("%Y-%m-%d")
     cursor.execute("SELECT name FROM users WHERE user_id IN (SELECT user_id FROM attendance WHERE date=? AND status='present') AND approved=1", (today_str,))
     present_names = [row[0] for row in cursor.fetchall()]
 
     if not present_names:
         msg = "🧹 Дежурства на сегодня:\nНикто не приходит."
-        try:
-            await bot.send_message(current_channel, msg)
-        except Exception as e:
-            await bot.send_message(TEACHER_ID, f"❌ Ошибка в канале: {e}")
 
         report = "📬 Ежедневный отчёт (8:25)\n\n"
         report += "✅ Придут:\n• Никто\n"
         report += "❌ Не придут:\n• Все или данные не заполнены\n"
         report += "\n🧹 Дежурит: <b>Нет</b> (никто не придёт)"
+        save_duty_run(today_str, None, None, [], [], msg, report)
+        conn.commit()
 
-        try:
-            await bot.send_message(TEACHER_ID, report, parse_mode="HTML")
-        except Exception as e:
-            print(f"[Отчёт учителю] Ошибка: {e}")
-
-        await bot.send_message(TEACHER_ID, "🚫 Сегодня никто не приходит — дежурных нет.")
+        posted, _ = await asyncio.gather(
+            delivery.send(current_channel, msg, tag="duty_post", day=today_str),
+            send_to_teacher(report, "🚫 Сегодня никто не приходит — дежурных нет."),
+        )
+        if posted is None:
+            await send_to_teacher(channel_failure_notice(today_str))
+        else:
+            remember_duty_post("duty_post", today_str, posted)
         return
 
+    teacher_notes = []
     daily_duty = None
     for name in roster:
         if name in present_names:
@@ -298,32 +440,17 @@ async def assign_daily_duty():
 
     if not daily_duty:
         daily_duty = present_names[0]
-        await bot.send_message(TEACHER_ID, f"⚠️ Назначен: {daily_duty}")
-
-    remove_first_from_duty()
+        teacher_notes.append(f"⚠️ Назначен: {daily_duty}")
 
     cursor.execute("SELECT user_id FROM users WHERE name=?", (daily_duty,))
     row = cursor.fetchone()
     if not row:
-        await bot.send_message(TEACHER_ID, f"❌ Ошибка: {daily_duty} не найден.")
+        remove_from_duty_roster(daily_duty)
+        await send_to_teacher(*teacher_notes, f"❌ Ошибка: {daily_duty} не найден.")
         return
     user_id = row[0]
 
-    msg = f"🧹 Дежурства на сегодня:\nДежурит: {daily_duty}"
-    try:
-        sent = await bot.send_message(current_channel, msg)
-        save_duty_message_id(sent.message_id)
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"❌ Ошибка: {e}")
-
-    try:
-        await bot.send_message(user_id, "🧹 Вы дежурный сегодня! Не забудьте отчитаться.")
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось оповестить {daily_duty}: {e}")
-
-    await bot.send_message(TEACHER_ID, f"✅ Дежурный назначен: <b>{daily_duty}</b>", parse_mode="HTML")
-
-    # === 📬 ОТПРАВКА ПОЛНОГО ОТЧЁТА УЧИТЕЛЮ ===
+    # === 📬 ПОЛНЫЙ ОТЧЁТ УЧИТЕЛЮ ===
     cursor.execute("SELECT name, reason FROM users LEFT JOIN attendance ON users.user_id = attendance.user_id AND attendance.date=? WHERE attendance.status='absent' AND users.role='student' AND approved=1", (today_str,))
     absent_rows = cursor.fetchall()
     absent = [f"{name} ({reason})" for name, reason in absent_rows]
@@ -336,25 +463,100 @@ async def assign_daily_duty():
         report += "❌ Никто не отсутствует\n"
 
     report += f"\n🧹 Дежурит: <b>{daily_duty}</b>"
+    msg = f"🧹 Дежурства на сегодня:\nДежурит: {daily_duty}"
 
-    try:
-        await bot.send_message(TEACHER_ID, report, parse_mode="HTML")
-    except Exception as e:
-        print(f"[Отчёт учителю] Ошибка отправки: {e}")
+    # Итог дня, событие журнала и сдвиг очереди — одной транзакцией
+    journal.record("duty_assigned", day=today_str, name=daily_duty, user_id=user_id, manual=False)
+    save_duty_run(today_str, daily_duty, user_id, present_names, absent, msg, report)
+    move_to_end_of_duty(daily_duty)
+
+    # Канал, дежурный и учитель друг от друга не зависят — отправляем параллельно
+    posted, notified, _ = await asyncio.gather(
+        delivery.send(current_channel, msg, tag="duty_post", day=today_str),
+        delivery.send(user_id, "🧹 Вы дежурный сегодня! Не забудьте отчитаться.", idempotent=True, day=today_str),
+        send_to_teacher(*teacher_notes, f"✅ Дежурный назначен: <b>{daily_duty}</b>", report),
+    )
+    if posted is not None:
+        remember_duty_post("duty_post", today_str, posted)
+
+    failures = []
+    if posted is None:
+        failures.append(channel_failure_notice(today_str))
+    if notified is None:
+        failures.append(f"⚠️ Не удалось оповестить {daily_duty}.")
+    if failures:
+        await send_to_teacher(*failures)
+
+# === Повтор отчёта из сохранённого итога дня ===
+async def replay_duty_run(run: dict):
+    # Ничего не пересчитываем и очередь не трогаем: правим пост в канале
+    # (или публикуем заново, если его нет) и повторяем отчёт учителю
+    if run["channel_text"]:
+        posted = False
+        if run["message_id"]:
+            posted = await delivery.edit(current_channel, run["message_id"], run["channel_text"],
+                                         tag="duty_edit", day=run["day"])
+        elif delivery.queued("duty_post", run["day"]):
+            # Первый пост ещё ждёт в очереди недоставленных
+            posted = None
+        # Публикуем заново, только если поста нет. При временной ошибке
+        # правка уже в очереди недоставленных — второй пост был бы лишним
+        if posted is False:
+            sent = await delivery.send(current_channel, run["channel_text"], tag="duty_post", day=run["day"])
+            if sent is not None:
+                remember_duty_post("duty_post", run["day"], sent)
+    await send_to_teacher("🔁 Повтор отчёта за " + run["day"] + "\n\n" + run["report"])
 
 # === Планировщик ===
+# Не опрашиваем часы каждые 10 секунд, а спим до ближайших 8:25,
+# но не дольше SCHEDULER_MAX_SLEEP — чтобы сверяться с часами
+SCHEDULER_MAX_SLEEP = 300
+
+def duty_time_on(now: datetime) -> datetime:
+    return now.replace(hour=(8 - TEACHER_TIMEZONE_OFFSET) % 24, minute=25, second=0, microsecond=0)
+
+def next_duty_time(now: datetime) -> datetime:
+    target = duty_time_on(now)
+    if target <= now:
+        target += timedelta(days=1)
+    return target
+
 async def run_scheduler():
+    target = next_duty_time(clock.now())
     while True:
-        if bot_active:
-            now = datetime.now()
-            hour_local = (now.hour + TEACHER_TIMEZONE_OFFSET) % 24
-            minute, second = now.minute, now.second
-
-            if not is_weekend():
-                if hour_local == 8 and minute == 25 and second < 10:
-                    await assign_daily_duty()
-                    await asyncio.sleep(60)
-        await asyncio.sleep(10)
+        delay = (target - clock.now()).total_seconds()
+        if delay > 0:
+            await clock.sleep(min(delay, SCHEDULER_MAX_SLEEP))
+            continue
+        if bot_active and not is_weekend():
+            await assign_daily_duty()
+        journal.maybe_checkpoint()
+        target = next_duty_time(clock.now())
+
+# === Резервные копии ===
+backup_lock = asyncio.Lock()
+
+async def make_backup() -> dict:
+    async with backup_lock:
+        return await backup_async(DB_PATH, BACKUP_DIR, BACKUP_KEEP)
+
+async def run_backup_scheduler():
+    interval = BACKUP_INTERVAL_HOURS * 3600
+    # Первую копию отсчитываем от последней на диске, а не от запуска:
+    # бот, который перезапускают чаще интервала, иначе копий не делал бы
+    newest = latest_backup_time(BACKUP_DIR, os.path.splitext(os.path.basename(DB_PATH))[0])
+    delay = 0 if newest is None else max(0, newest + interval - time.time())
+    while True:
+        await clock.sleep(delay)
+        try:
+            info = await make_backup()
+            print(f"[Бэкап] {info['path']} ({info['size']} байт, {info['seconds']:.2f} с)")
+            delay = interval
+        except Exception as e:
+            print(f"[Бэкап] Ошибка: {e}")
+            await delivery.send(TEACHER_ID, f"⚠️ Резервная копия не создана: {e}", idempotent=True)
+            # Следующая попытка — через час, а не через целый интервал
+            delay = min(interval, 3600)
 
 # === /start ===
 @dp.message(Command("start"))
@@ -363,6 +565,8 @@ async def cmd_start(message: types.Message, state: FSMContext):
 
     if user_id == TEACHER_ID:
         cursor.execute("INSERT OR IGNORE INTO users (user_id, name, role, approved) VALUES (?, 'Классный руководитель', 'teacher', 1)", (user_id,))
+        if cursor.rowcount:
+            journal.record("user_registered", user_id=user_id, name="Классный руководитель", role="teacher", approved=1, replace=False)
         conn.commit()
         await message.answer("👨‍🏫 Добро пожаловать!", reply_markup=get_teacher_kb())
         return
@@ -398,6 +602,7 @@ async def process_name(message: types.Message, state: FSMContext):
 
     user_id = message.from_user.id
     cursor.execute("INSERT OR REPLACE INTO users (user_id, name, role, approved) VALUES (?, ?, 'student', 0)", (user_id, name))
+    journal.record("user_registered", user_id=user_id, name=name, role="student", approved=0)
     conn.commit()
 
     await bot.send_message(
@@ -416,6 +621,7 @@ async def approve_student(callback: types.CallbackQuery):
         return
     user_id = int(callback.data.split("_")[1])
     cursor.execute("UPDATE users SET approved=1 WHERE user_id=?", (user_id,))
+    journal.record("user_approved", user_id=user_id)
     conn.commit()
 
     cursor.execute("SELECT name FROM users WHERE user_id=?", (user_id,))
@@ -435,9 +641,9 @@ async def approve_student(callback: types.CallbackQuery):
             add_to_duty_roster(n)
         await bot.send_message(TEACHER_ID, "📋 Список дежурных отсортирован по алфавиту.")
 
-    today = datetime.now().strftime("%Y-%m-%d")
-    set_absent_from_date(user_id, today, "болезнь")
-    clear_future_absent_from(user_id, today)
+    today = clock.now().strftime("%Y-%m-%d")
+    await set_absent_from_date(user_id, today, "болезнь")
+    await clear_future_absent_from(user_id, today)
 
     await bot.send_message(user_id, "✅ Вы приняты! Вы в списке дежурных.", reply_markup=get_student_kb())
     await callback.message.edit_text(f"{callback.message.text}\n\n✅ Принято.")
@@ -450,11 +656,117 @@ async def decline_student(callback: types.CallbackQuery):
         return
     user_id = int(callback.data.split("_")[1])
     cursor.execute("DELETE FROM users WHERE user_id=?", (user_id,))
+    journal.record("user_removed", user_id=user_id)
     conn.commit()
     await bot.send_message(user_id, "❌ Ваша заявка отклонена.")
     await callback.message.edit_text(f"{callback.message.text}\n\n❌ Отклонено.")
     await callback.answer("Отклонено")
 
+# === ПОСТРАНИЧНЫЕ ОТЧЁТЫ ===
+# Одна страница — один запрос: ученики после (или до) ключа вместе с их
+# отметками за нужные дни. Лишний (PAGE_SIZE + 1)-й ученик только
+# сообщает, что дальше есть ещё страница.
+
+STUDENT_PAGE_SQL = '''
+    WITH page AS (
+        SELECT user_id, name FROM users
+        WHERE role='student' AND approved=1
+          AND (name, user_id) {op} ((SELECT name FROM users WHERE user_id=?), ?)
+        ORDER BY name {order}, user_id {order}
+        LIMIT ?
+    )
+    SELECT page.user_id, page.name, attendance.date, attendance.status, attendance.reason
+    FROM page LEFT JOIN attendance
+      ON attendance.user_id = page.user_id AND attendance.date BETWEEN ? AND ?
+    ORDER BY page.name {order}, page.user_id {order}
+'''
+
+def fetch_student_page(direction: str, key: int, first_date: str, last_date: str):
+    # Возвращает [(user_id, name, {дата: (статус, причина)})] по возрастанию имени
+    # и признак, что в направлении листания есть ещё ученики.
+    # Если ключевого ученика уже нет, имя — NULL и страница пустая.
+    sql = STUDENT_PAGE_SQL.format(op="<" if direction == "p" else ">", order="DESC" if direction == "p" else "ASC")
+    if not key:
+        sql = sql.replace("(SELECT name FROM users WHERE user_id=?)", "''")
+    students = []
+    for user_id, name, date, status, reason in cursor.execute(
+        sql, ((key,) if key else ()) + (key, PAGE_SIZE + 1, first_date, last_date)
+    ).fetchall():
+        if not students or students[-1][0] != user_id:
+            students.append((user_id, name, {}))
+        if date:
+            students[-1][2][date] = (status, reason)
+    more = len(students) > PAGE_SIZE
+    students = students[:PAGE_SIZE]
+    if direction == "p":
+        students.reverse()
+    return students, more
+
+def render_class_line(name: str, marks: dict, day: str) -> str:
+    status, reason = marks.get(day, ("present", None))
+    if status == "present":
+        return f"{name} — ✅ идёт"
+    reason_text = reason if reason else "не указана"
+    return f"{name} — ❌ не идёт ({reason_text})"
+
+def render_month_line(name: str, marks: dict, dates: list) -> str:
+    day_icons = []
+    for date in dates:
+        status, reason = marks.get(date, ("present", None))
+        day = date.split("-")[2]
+        if status == "present":
+            day_icons.append(f"{day}✅")
+        else:
+            short_reason = (reason or "—")[:6]
+            day_icons.append(f"{day}{short_reason}")
+    line = f"{name}: {' '.join(day_icons)}"
+    if len(line) > 100:
+        line = line[:97] + "..."
+    return line
+
+def render_page(view: str, param: str, direction: str, number: int, key: int):
+    if view == "class":
+        first_date = last_date = param
+    else:
+        dates = get_dates_in_month(param)
+        first_date, last_date = dates[0], dates[-1]
+
+    students, more = fetch_student_page(direction, key, first_date, last_date)
+    if not students:
+        if key:
+            # Ключевой ученик удалён или список сократился — с начала
+            return render_page(view, param, "n", 1, 0)
+        return ("📚 Класс пуст." if view == "class" else "📚 Нет учеников."), None
+
+    if view == "class":
+        header = "👥 Список класса"
+        lines = [render_class_line(name, marks, param) for _, name, marks in students]
+    else:
+        month_name = datetime.strptime(param, "%Y-%m").strftime("%B %Y")
+        header = f"📋 Посещаемость за {month_name}"
+        lines = [render_month_line(name, marks, dates) for _, name, marks in students]
+
+    has_prev = more if direction == "p" else number > 1
+    has_next = more if direction == "n" else True
+    if has_prev or has_next:
+        header += f" (стр. {number})"
+    if view == "class":
+        header += ":"
+    text = header + "\n\n" + "\n".join(lines)
+    kb = page_kb(view, param, number, students[0][0], students[-1][0], has_prev, has_next)
+    return text, kb
+
+def build_page(view: str, param: str, direction: str, number: int, key: int):
+    # Страница из кэша годится, пока журнал не сообщил об изменениях
+    cache_key = (view, param, direction, number, key)
+    page = page_cache.get(cache_key, journal.version)
+    if page is None:
+        page = render_page(view, param, direction, number, key)
+        page_cache.put(cache_key, journal.version, page)
+    return page
+
+PAGE_VIEWS = ("class", "month")
+
 # === Учитель: Команды ===
 
 @dp.message(F.text == "📋 Список класса")
@@ -465,44 +777,15 @@ async def list_students(message: types.Message):
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
 
-    cursor.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC")
-    students = cursor.fetchall()
-
-    if not students:
-        await message.answer("📚 Класс пуст.")
-        return
-
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    report_lines = ["👥 Список класса:\n"]
-
-    for user_id, name in students:
-        cursor.execute("SELECT status, reason FROM attendance WHERE user_id=? AND date=?", (user_id, today_str))
-        row = cursor.fetchone()
-        if row:
-            status, reason = row
-            if status == "present":
-                line = f"{name} — ✅ идёт"
-            else:
-                reason_text = reason if reason else "не указана"
-                line = f"{name} — ❌ не идёт ({reason_text})"
-        else:
-            line = f"{name} — ✅ идёт"
-        report_lines.append(line)
-
-    full_report = "\n".join(report_lines)
-    if len(full_report) > 4096:
-        for i in range(0, len(report_lines), 25):
-            part = "\n".join(report_lines[i:i+25])
-            if part.strip():
-                await message.answer(part)
-    else:
-        await message.answer(full_report)
+    today_str = clock.now().strftime("%Y-%m-%d")
+    text, kb = build_page("class", today_str, "n", 1, 0)
+    await message.answer(text, reply_markup=kb)
 
 @dp.message(Command("status"))
 async def cmd_status(message: types.Message):
     if message.from_user.id != TEACHER_ID:
         return
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    today_str = clock.now().strftime("%Y-%m-%d")
     cursor.execute("SELECT name FROM users WHERE user_id IN (SELECT user_id FROM attendance WHERE date=? AND status='present') AND role='student' AND approved=1", (today_str,))
     present = [row[0] for row in cursor.fetchall()]
     cursor.execute("SELECT name, reason FROM users LEFT JOIN attendance ON users.user_id = attendance.user_id AND attendance.date=? WHERE attendance.status='absent' AND users.role='student' AND approved=1", (today_str,))
@@ -527,44 +810,27 @@ async def cmd_attendance(message: types.Message):
     if message.from_user.id != TEACHER_ID:
         return
 
-    dates = get_dates_in_month()
-    month_name = datetime.now().strftime("%B %Y")
+    month = clock.now().strftime("%Y-%m")
+    text, kb = build_page("month", month, "n", 1, 0)
+    await message.answer(text, reply_markup=kb)
 
-    cursor.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC")
-    students = cursor.fetchall()
-
-    if not students:
-        await message.answer("📚 Нет учеников.")
+@dp.callback_query(F.data.startswith("page:"))
+async def turn_page(callback: types.CallbackQuery):
+    if callback.from_user.id != TEACHER_ID:
+        await callback.answer()
         return
-
-    report_lines = [f"📋 Посещаемость за {month_name}\n"]
-
-    for user_id, name in students:
-        att = get_attendance_for_user(user_id)
-        day_icons = []
-        for date in dates:
-            status, reason = att[date]
-            day = date.split("-")[2]
-            if status == "present":
-                day_icons.append(f"{day}✅")
-            else:
-                short_reason = (reason or "—")[:6]
-                day_icons.append(f"{day}{short_reason}")
-        line = f"{name}: {' '.join(day_icons)}"
-        if len(line) > 100:
-            line = line[:97] + "..."
-        report_lines.append(line)
-
-    full_report = "\n".join(report_lines)
-
-    if len(full_report) > 4096:
-        await message.answer("📋 Отчёт слишком большой. Отправляю по частям...")
-        for i in range(0, len(report_lines), 20):
-            part = "\n".join(report_lines[i:i+20])
-            if part.strip():
-                await message.answer(part)
-    else:
-        await message.answer(full_report)
+    parsed = parse_page_data(callback.data)
+    if not parsed or parsed[0] not in PAGE_VIEWS:
+        await callback.answer("Ошибка")
+        return
+    text, kb = build_page(*parsed)
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest as e:
+        # Страница не изменилась — это не ошибка
+        if "message is not modified" not in str(e):
+            print(f"[Страницы] {e}")
+    await callback.answer()
 
 @dp.message(F.text == "➕ Добавить дежурного")
 async def prompt_duty_name(message: types.Message, state: FSMContext):
@@ -593,26 +859,35 @@ async def set_duty(message: types.Message, state: FSMContext):
         return
 
     user_id = row[0]
+    today_str = clock.now().strftime("%Y-%m-%d")
+    journal.record("duty_assigned", day=today_str, name=name, user_id=user_id, manual=True)
+    conn.commit()
     msg_text = f"🧹 Дежурства на сегодня:\nДежурит: {name}"
+    run = load_duty_run(today_str)
+    if run:
+        report = re.sub(r"🧹 Дежурит: <b>.*?</b>.*$", f"🧹 Дежурит: <b>{name}</b> (назначен вручную)", run["report"])
+        update_duty_run(today_str, duty_name=name, user_id=user_id, channel_text=msg_text, report=report)
 
     msg_id = get_duty_message_id()
-    try:
-        if msg_id:
-            await bot.edit_message_text(
-                chat_id=current_channel,
-                message_id=msg_id,
-                text=msg_text
-            )
-        else:
-            sent = await bot.send_message(current_channel, msg_text)
-            save_duty_message_id(sent.message_id)
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось обновить канал: {e}")
-
-    try:
-        await bot.send_message(user_id, "🧹 Вам назначен статус дежурного! Не забудьте отчитаться.")
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось оповестить {name}: {e}")
+    if msg_id:
+        channel_update = delivery.edit(current_channel, msg_id, msg_text, tag="duty_edit", day=today_str)
+    else:
+        channel_update = delivery.send(current_channel, msg_text, tag="duty_post", day=today_str)
+    posted, notified = await asyncio.gather(
+        channel_update,
+        delivery.send(user_id, "🧹 Вам назначен статус дежурного! Не забудьте отчитаться.",
+                      idempotent=True, day=today_str),
+    )
+    if posted is False:
+        # Старый пост удалён — публикуем заново
+        msg_id = None
+        posted = await delivery.send(current_channel, msg_text, tag="duty_post", day=today_str)
+    if posted is None:
+        await message.answer(channel_failure_notice(today_str))
+    elif not msg_id:
+        remember_duty_post("duty_post", today_str, posted)
+    if notified is None:
+        await message.answer(f"⚠️ Не удалось оповестить {name}.")
 
     await message.answer(f"✅ Дежурный назначен: <b>{name}</b>", parse_mode="HTML")
     await state.clear()
@@ -689,9 +964,11 @@ async def delete_student(message: types.Message, state: FSMContext):
                 await bot.send_message(user_id, "🚫 Вы удалены из класса.", reply_markup=types.ReplyKeyboardRemove())
             except Exception as e:
                 print(f"[Ошибка] {e}")
+            journal.record("student_deleted", user_id=user_id, name=name)
             cursor.execute("DELETE FROM users WHERE name=? AND role='student'", (name,))
             remove_from_duty_roster(name)
             cursor.execute("DELETE FROM attendance WHERE user_id=?", (user_id,))
+            attendance_index.remove_user(user_id)
             conn.commit()
         await message.answer(f"✅ Удалён: {name}" if cursor.rowcount else "❌ Не найден.")
         await state.clear()
@@ -701,9 +978,11 @@ async def delete_student(message: types.Message, state: FSMContext):
 async def confirm_delete_all(callback: types.CallbackQuery, state: FSMContext):
     cursor.execute("SELECT user_id FROM users WHERE role='student'")
     students = cursor.fetchall()
+    journal.record("all_students_deleted")
     cursor.execute("DELETE FROM users WHERE role='student'")
     clear_duty_roster()
     cursor.execute("DELETE FROM attendance")
+    attendance_index.clear()
     conn.commit()
     for (user_id,) in students:
         try:
@@ -729,7 +1008,18 @@ async def resend_channel_report(message: types.Message):
     if not bot_active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
-    await assign_daily_duty()
+    now = clock.now()
+    run = load_duty_run(now.strftime("%Y-%m-%d"))
+    if run:
+        # Итог дня уже есть — повторяем его, а не назначаем заново
+        await replay_duty_run(run)
+    elif now < duty_time_on(now):
+        # До 8:25 итог дня не создаём: иначе планировщик решит, что день
+        # уже обработан, а отметиться ещё никто не успел
+        await message.answer("⏳ Отчёт за сегодня появится в 8:25 — повторять пока нечего.")
+        return
+    else:
+        await assign_daily_duty()
     await message.answer("📤 Запрос отправлен.")
 
 
@@ -764,6 +1054,14 @@ async def teacher_help(message: types.Message):
 /status — кто сегодня идёт  
 /reset_duty_list — сброс очереди  
 /set_channel — изменить канал (работает с приватными)  
+/absences [с] [по] — пропуски учеников и самые «пустые» дни  
+/duty_runs [ГГГГ-ММ-ДД] — итоги прошлых дней  
+/history ГГГГ-ММ-ДД — кто дежурил и кто пришёл в этот день  
+/stats — счётчики записи и отброшенных нажатий  
+/delivery — состояние доставки, повтор недоставленных  
+/backup — резервная копия базы (придёт документом)  
+/profile [N] [T] — профилирование следующих N обновлений / T секунд  
+/profile slow — самые медленные обновления  
 /help — это сообщение
 
 Кнопки:
@@ -806,12 +1104,215 @@ async def cmd_next_duty(message: types.Message):
         await message.answer("📋 Список дежурных пуст.")
         return
     next_name = names[0]
-    cursor.execute("SELECT status FROM attendance WHERE user_id=(SELECT user_id FROM users WHERE name=?) AND date=?", (next_name, datetime.now().strftime("%Y-%m-%d")))
+    cursor.execute("SELECT status FROM attendance WHERE user_id=(SELECT user_id FROM users WHERE name=?) AND date=?", (next_name, clock.now().strftime("%Y-%m-%d")))
     row = cursor.fetchone()
     status_text = " ✅ придёт" if row and row[0] == "present" else " ❌ не придёт"
     await message.answer(f"➡️ Следующий: <b>{next_name}</b>{status_text}", parse_mode="HTML")
 
 
+@dp.message(Command("duty_runs"))
+async def cmd_duty_runs(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+
+    args = message.text.split(maxsplit=1)
+    if len(args) == 2:
+        run = load_duty_run(args[1].strip())
+        if not run:
+            await message.answer("📭 За этот день итогов нет. Формат: <code>/duty_runs 2025-03-03</code>", parse_mode="HTML")
+            return
+        await message.answer(f"🗓 {run['day']}\n\n{run['report']}", parse_mode="HTML")
+        return
+
+    cursor.execute("SELECT day, duty_name, present, absent FROM duty_runs ORDER BY day DESC LIMIT 14")
+    rows = cursor.fetchall()
+    if not rows:
+        await message.answer("📭 Итогов пока нет.")
+        return
+    lines = ["🗂 Итоги последних дней:\n"]
+    for day, duty_name, present, absent in rows:
+        lines.append(f"{day} — 🧹 {duty_name or 'нет'}, ✅ {len(json.loads(present))}, ❌ {len(json.loads(absent))}")
+    lines.append("\nПодробно: /duty_runs ГГГГ-ММ-ДД")
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("history"))
+async def cmd_history(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+
+    args = message.text.split(maxsplit=1)
+    try:
+        day = datetime.strptime(args[1].strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (IndexError, ValueError):
+        await message.answer("📌 Используйте: <code>/history 2025-03-03</code>", parse_mode="HTML")
+        return
+
+    # Состояние на конец дня, собранное из журнала
+    state = journal.state_at(day + "~")
+    present, absent = [], []
+    for user_id, user in sorted(state["users"].items(), key=lambda item: item[1]["name"]):
+        if user["role"] != "student" or not user["approved"]:
+            continue
+        status, reason = state["attendance"].get((user_id, day), (None, None))
+        if status == "present":
+            present.append(user["name"])
+        elif status == "absent":
+            absent.append(f"{user['name']} ({reason})")
+
+    duty = journal.duty_on(day)
+    report = f"🗓 {day}\n\n🧹 Дежурил: <b>{duty or 'никто'}</b>\n"
+    report += "✅ Пришли:\n" + ("\n".join([f"• {name}" for name in present]) or "• Никто") + "\n"
+    report += "❌ Не пришли:\n" + ("\n".join([f"• {item}" for item in absent]) or "• Никто") + "\n"
+    report += f"\n📜 Событий за день: {len(journal.events_on(day))}"
+    await message.answer(report, parse_mode="HTML")
+
+
+@dp.message(Command("backup"))
+async def cmd_backup(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+    if backup_lock.locked():
+        await message.answer("⏳ Копия уже создаётся, подождите.")
+        return
+    await message.answer("💾 Создаю резервную копию...")
+    try:
+        info = await make_backup()
+    except Exception as e:
+        await message.answer(f"❌ Не удалось создать копию: {e}")
+        return
+    caption = (
+        f"💾 Резервная копия проверена (integrity_check: ok)\n"
+        f"{info['size'] // 1024} КБ, {info['seconds']:.2f} с"
+    )
+    try:
+        await message.answer_document(FSInputFile(info["path"]), caption=caption)
+    except Exception as e:
+        await message.answer(f"⚠️ Копия сохранена ({info['path']}), но отправить не удалось: {e}")
+
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+    queue = attendance_queue.stats
+    report = (
+        "📈 Счётчики\n\n"
+        "💾 Запись посещаемости:\n"
+        f"• транзакций: {queue['batches']}, строк записано: {queue['rows']}\n"
+        f"• пропущено записей без изменений: {attendance_stats['suppressed_writes']}\n"
+        f"• пропущено строк без изменений: {attendance_stats['suppressed_rows']}\n\n"
+        "🖐 Входящие:\n"
+        f"• обработано: {throttling.stats['passed']}\n"
+        f"• повторных нажатий отброшено: {throttling.stats['dropped_duplicates']}\n"
+        f"• отброшено по лимиту: {throttling.stats['throttled']}\n\n"
+        "📄 Постраничные отчёты:\n"
+        f"• страниц из кэша: {page_cache.stats['hits']}, собрано заново: {page_cache.stats['misses']}"
+    )
+    await message.answer(report)
+
+
+@dp.message(Command("delivery"))
+async def cmd_delivery(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+    delivered = await delivery.retry_dead_letters()
+    stats = delivery.stats
+    open_chats = delivery.breaker.open_chats()
+    report = (
+        "📨 Доставка\n\n"
+        f"• отправлено: {stats['sent']}, повторов: {stats['retries']}, ошибок: {stats['failed']}\n"
+        f"• отложено предохранителем: {stats['short_circuited']}\n"
+        f"• с неясным исходом (не повторялись): {stats['uncertain']}\n"
+        f"• в очереди недоставленных: {delivery.pending()} (сейчас доставлено: {delivered})\n"
+        f"• недоступные чаты: {', '.join(map(str, open_chats)) if open_chats else 'нет'}"
+    )
+    await message.answer(report)
+
+
+@dp.message(Command("absences"))
+async def cmd_absences(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+
+    # По умолчанию — с 1 сентября текущего учебного года по сегодня
+    today = clock.now().date()
+    year = today.year if today.month >= 9 else today.year - 1
+    args = message.text.split()[1:]
+    try:
+        start = datetime.strptime(args[0], "%Y-%m-%d").date() if len(args) > 0 else datetime(year, 9, 1).date()
+        end = datetime.strptime(args[1], "%Y-%m-%d").date() if len(args) > 1 else today
+    except ValueError:
+        await message.answer(
+            "📌 Используйте: <code>/absences</code> или <code>/absences 2025-01-09 2025-03-21</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    attendance_index.ensure_loaded(conn)
+    started = time.perf_counter()
+    mask = attendance_index.school_days_mask(start, end)
+    by_student = attendance_index.absent_by_student(mask)
+    busiest = attendance_index.busiest_days(mask)
+    any_absent = attendance_index.days_anyone_absent(mask)
+    elapsed = time.perf_counter() - started
+
+    cursor.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC")
+    students = cursor.fetchall()
+    if not students:
+        await message.answer("📚 Нет учеников.")
+        return
+
+    rows = sorted(((by_student.get(user_id, 0), name) for user_id, name in students), key=lambda item: (-item[0], item[1]))
+    report = f"📉 Пропуски с {start:%d.%m.%Y} по {end:%d.%m.%Y} (учебных дней: {popcount(mask)})\n\n"
+    report += "\n".join([f"{name} — {count}" for count, name in rows]) + "\n\n"
+    if busiest:
+        report += "📅 Больше всего отсутствующих:\n" + "\n".join([f"• {day:%d.%m.%Y} — {count}" for day, count in busiest]) + "\n"
+    report += f"Дней, когда кто-то отсутствовал: {any_absent}\n\n"
+    report += f"⚡ {elapsed * 1_000_000:.0f} мкс, индекс {attendance_index.memory_bytes()} байт"
+    await message.answer(report)
+
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: types.Message):
+    if message.from_user.id != TEACHER_ID:
+        return
+
+    args = message.text.split()[1:]
+    if args and args[0] == "stop":
+        if not profiler.active:
+            await message.answer("ℹ️ Профилирование не запущено.")
+            return
+        await profiler.stop()
+        return
+    if args and args[0] == "slow":
+        await message.answer(f"<pre>{profiler.render_slowest()}</pre>", parse_mode="HTML")
+        return
+
+    try:
+        updates = int(args[0]) if len(args) > 0 else 50
+        seconds = int(args[1]) if len(args) > 1 else 60
+    except ValueError:
+        await message.answer(
+            "📌 Используйте: <code>/profile [N обновлений] [T секунд]</code>, "
+            "<code>/profile slow</code> или <code>/profile stop</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    async def send_report(report: str):
+        document = BufferedInputFile(report.encode("utf-8"), filename="profile.txt")
+        try:
+            await bot.send_document(TEACHER_ID, document, caption="📈 Результаты профилирования")
+        except Exception as e:
+            print(f"[Профилирование] Ошибка отправки: {e}")
+
+    if not profiler.start(updates, seconds, send_report):
+        await message.answer("⏳ Профилирование уже идёт. Остановить: /profile stop")
+        return
+    await message.answer(f"📈 Профилирую следующие {updates} обновлений или {seconds} с — что наступит раньше.")
+
+
 # === Ученик: Команды ===
 
 @dp.message(F.text == "✅ Приду в школу")
@@ -820,8 +1321,8 @@ async def mark_present(message: types.Message):
         await message.answer("🔴 Бот остановлен.")
         return
     user_id = message.from_user.id
-    today = datetime.now().strftime("%Y-%m-%d")
-    clear_future_absent_from(user_id, today)
+    today = clock.now().strftime("%Y-%m-%d")
+    await clear_future_absent_from(user_id, today)
     await message.answer("✅ Вы отметились как 'приду'. Будущие отсутствия отменены.")
 
 
@@ -842,8 +1343,8 @@ async def mark_absent(message: types.Message, state: FSMContext):
         return
     reason = message.text.strip()
     user_id = message.from_user.id
-    today = datetime.now().strftime("%Y-%m-%d")
-    set_absent_from_date(user_id, today, reason)
+    today = clock.now().strftime("%Y-%m-%d")
+    await set_absent_from_date(user_id, today, reason)
     await message.answer(f"❌ Вы отмечены как 'не приду'. Причина: {reason}")
     await state.clear()
 
@@ -862,20 +1363,24 @@ async def report_duty(message: types.Message):
     await message.answer("🧹 Вы отчитались! Молодец! 💪")
 
     # Редактируем сообщение в канале
+    today_str = clock.now().strftime("%Y-%m-%d")
     msg_id = get_duty_message_id()
     if msg_id:
-        try:
-            await bot.edit_message_text(
-                chat_id=current_channel,
-                message_id=msg_id,
-                text="🧹 Дежурства на сегодня:\nДежурный не назначен"
-            )
-        except Exception as e:
-            print(f"[Ошибка редактирования] {e}")
+        msg_text = "🧹 Дежурства на сегодня:\nДежурный не назначен"
+        if load_duty_run(today_str):
+            update_duty_run(today_str, channel_text=msg_text)
+        await delivery.edit(current_channel, msg_id, msg_text, tag="duty_edit", day=today_str)
+
+    # В конец очереди ученик ушёл ещё при назначении; назначенного
+    # вручную, которого в очереди нет, добавляем
+    journal.record("duty_reported", day=today_str, name=name)
+    if name in get_duty_list():
+        conn.commit()
+    else:
+        add_to_end_of_duty(name)
 
-    # Перемещаем в конец очереди
-    add_to_end_of_duty(name)
 
+delivery.on_redelivered = remember_duty_post
 
 # === ЗАПУСК БОТА ===
 async def main():
@@ -883,8 +1388,17 @@ async def main():
     global current_channel
     current_channel = load_setting("channel", CHANNEL_ID)
     
-    # Запускаем планировщик
+    # Запускаем планировщик, резервные копии и очередь записи
     asyncio.create_task(run_scheduler())
+    asyncio.create_task(run_backup_scheduler())
+    asyncio.create_task(delivery.run_dead_letters())
+    attendance_queue.start()
+
+    # HTTP API для дашбордов (по желанию) — в том же event loop
+    if API_ENABLED:
+        from api import create_app, start_api
+        await start_api(create_app(conn, journal), API_HOST, API_PORT)
+        print(f"[API] http://{API_HOST}:{API_PORT}/api/students")
     
     # Стартуем опрос бота
     await dp.start_polling(bot)
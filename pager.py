@@ -0,0 +1,65 @@
+# pager.py
+import time
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+# === ПОСТРАНИЧНЫЕ ОТЧЁТЫ ===
+# Большие списки показываются одной страницей с кнопками «◀️ / ▶️».
+# Страница выбирается по ключу (имя, user_id), а не по OFFSET: запрос
+# читает только её строки. Ключ и направление лежат в callback_data:
+#
+#   page:<вид>:<параметр>:<n|p>:<номер страницы>:<user_id ключа>
+#
+# n — строки после ключа, p — строки перед ним. user_id ключа 0 — начало.
+# Перелистывание редактирует то же сообщение. Готовые страницы недолго
+# хранятся в PageCache и сбрасываются при любом изменении данных.
+
+PREFIX = "page"
+
+
+def page_data(view: str, param: str, direction: str, number: int, key: int) -> str:
+    # Telegram ограничивает callback_data 64 байтами — здесь меньше 40
+    return f"{PREFIX}:{view}:{param}:{direction}:{number}:{key}"
+
+
+def parse_page_data(data: str):
+    try:
+        _, view, param, direction, number, key = data.split(":")
+        return view, param, direction, int(number), int(key)
+    except ValueError:
+        return None
+
+
+def page_kb(view: str, param: str, number: int, first_key, last_key, has_prev: bool, has_next: bool):
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=page_data(view, param, "p", number - 1, first_key)))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=page_data(view, param, "n", number + 1, last_key)))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+class PageCache:
+    def __init__(self, ttl: float = 60, size: int = 64):
+        self.ttl = ttl
+        self.size = size
+        self.pages = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, version: int):
+        entry = self.pages.get(key)
+        if entry is None or entry[0] != version or time.monotonic() - entry[1] >= self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[2]
+
+    def put(self, key, version: int, page):
+        if len(self.pages) >= self.size:
+            # Выбрасываем самую старую страницу
+            oldest = min(self.pages, key=lambda k: self.pages[k][1])
+            del self.pages[oldest]
+        self.pages[key] = (version, time.monotonic(), page)
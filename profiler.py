@@ -0,0 +1,212 @@
+# profiler.py
+import asyncio
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import selectors
+import time
+import tracemalloc
+from collections import deque
+
+from aiogram import BaseMiddleware
+
+
+# === ПРОФИЛИРОВАНИЕ ЖИВОГО БОТА ===
+# Пока сессия не запущена, middleware не зарегистрирован, cProfile и
+# tracemalloc выключены — накладных расходов нет совсем.
+
+_current_update = contextvars.ContextVar("current_update", default=None)
+
+# cProfile не выключается на время await, поэтому в профиль попадает и
+# сам event loop: ожидание в epoll, _run_once. Эти кадры выбрасываем.
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOOP_FILES = (os.path.dirname(asyncio.__file__), selectors.__file__)
+LOOP_BUILTINS = ("select.", "epoll", "kqueue", "poll'", "'run' of '_contextvars.Context'")
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    async def __call__(self, handler, event, data):
+        return await self.profiler.measure(handler, event, data)
+
+
+class UpdateProfiler:
+    def __init__(self, dp, conn, slow_log_size: int = 50):
+        self.dp = dp
+        self.conn = conn
+        self.middleware = ProfilingMiddleware(self)
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.active = False
+        self.profile = None
+        self.running = 0
+        self.updates_left = 0
+        self.updates_seen = 0
+        self.started = 0.0
+        self.first_snapshot = None
+        self.timer = None
+        self.on_finish = None
+
+    # --- Управление сессией ---
+
+    def start(self, updates: int, seconds: float, on_finish):
+        # on_finish(report: str) вызывается по окончании сессии
+        if self.active:
+            return False
+        self.active = True
+        self.profile = cProfile.Profile()
+        self.running = 0
+        self.updates_left = updates
+        self.updates_seen = 0
+        self.started = time.perf_counter()
+        self.on_finish = on_finish
+        tracemalloc.start(10)
+        self.first_snapshot = tracemalloc.take_snapshot()
+        self.conn.set_trace_callback(self._on_query)
+        self.dp.message.middleware(self.middleware)
+        self.dp.callback_query.middleware(self.middleware)
+        self.timer = asyncio.create_task(self._expire(seconds))
+        return True
+
+    async def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self.dp.message.middleware.unregister(self.middleware)
+        self.dp.callback_query.middleware.unregister(self.middleware)
+        self.conn.set_trace_callback(None)
+        if self.timer and self.timer is not asyncio.current_task():
+            self.timer.cancel()
+        self.timer = None
+        self.profile.disable()
+
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        report = self._render(snapshot)
+        self.profile = None
+        self.first_snapshot = None
+        await self.on_finish(report)
+
+    async def _expire(self, seconds: float):
+        await asyncio.sleep(seconds)
+        await self.stop()
+
+    # --- Замер одного обновления ---
+
+    async def measure(self, handler, event, data):
+        record = {"handler": _handler_name(data), "queries": 0}
+        token = _current_update.set(record)
+        # running считает обработчики только этой сессии: обработчик,
+        # начатый в прошлой сессии, не должен трогать счётчик новой
+        profile = self.profile
+        if self.running == 0:
+            profile.enable()
+        self.running += 1
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            record["duration"] = time.perf_counter() - started
+            record["at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            _current_update.reset(token)
+            self.slow_log.append(record)
+            if profile is self.profile:
+                self.running -= 1
+                if self.running == 0:
+                    profile.disable()
+                self.updates_seen += 1
+                self.updates_left -= 1
+                if self.active and self.updates_left <= 0:
+                    asyncio.create_task(self.stop())
+
+    def _on_query(self, statement):
+        record = _current_update.get()
+        if record is not None:
+            record["queries"] += 1
+
+    # --- Отчёты ---
+
+    def slowest(self, limit: int = 15):
+        return sorted(self.slow_log, key=lambda r: r["duration"], reverse=True)[:limit]
+
+    def render_slowest(self, limit: int = 15) -> str:
+        rows = self.slowest(limit)
+        if not rows:
+            return "Пока нет замеров."
+        lines = [f"{'мс':>9}  {'SQL':>4}  {'время':19}  обработчик"]
+        for r in rows:
+            lines.append(f"{r['duration'] * 1000:9.1f}  {r['queries']:4d}  {r['at']:19}  {r['handler']}")
+        return "\n".join(lines)
+
+    def _render(self, snapshot) -> str:
+        elapsed = time.perf_counter() - self.started
+        out = io.StringIO()
+        out.write(f"Профилирование: {self.updates_seen} обновлений за {elapsed:.1f} с\n\n")
+
+        out.write("=== Самые медленные обновления ===\n")
+        out.write(self.render_slowest() + "\n\n")
+
+        out.write("=== Горячие функции (cProfile, собственное время) ===\n")
+        stats = _filtered_stats(self.profile, out, lambda key: not _is_loop_frame(key))
+        if stats:
+            stats.strip_dirs().sort_stats("tottime").print_stats(30)
+        else:
+            out.write("Нет данных.\n")
+
+        out.write("=== Функции бота (cProfile, cumulative) ===\n")
+        stats = _filtered_stats(self.profile, out, _is_project_frame)
+        if stats:
+            stats.strip_dirs().sort_stats("cumulative").print_stats(20)
+        else:
+            out.write("Нет данных.\n")
+
+        out.write("\n=== Места выделения памяти (tracemalloc) ===\n")
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        diff = snapshot.filter_traces(filters).compare_to(
+            self.first_snapshot.filter_traces(filters), "lineno"
+        )
+        for stat in diff[:20]:
+            out.write(f"{stat}\n")
+        return out.getvalue()
+
+
+def _filtered_stats(profile, stream, keep):
+    # pstats.Stats только с кадрами, для которых keep((файл, строка, функция))
+    try:
+        stats = pstats.Stats(profile, stream=stream)
+    except TypeError:
+        return None
+    for key in [key for key in stats.stats if not keep(key)]:
+        del stats.stats[key]
+    if not stats.stats:
+        return None
+    stats.total_calls = sum(entry[1] for entry in stats.stats.values())
+    stats.prim_calls = sum(entry[0] for entry in stats.stats.values())
+    stats.total_tt = sum(entry[2] for entry in stats.stats.values())
+    return stats
+
+
+def _is_loop_frame(key) -> bool:
+    filename, _, function = key
+    if filename == "~":
+        return any(marker in function for marker in LOOP_BUILTINS)
+    return filename.startswith(LOOP_FILES)
+
+
+def _is_project_frame(key) -> bool:
+    # Сам профилировщик оборачивает каждый обработчик — его не показываем
+    filename = key[0]
+    return (filename.startswith(PROJECT_DIR) and "site-packages" not in filename
+            and os.path.abspath(filename) != os.path.abspath(__file__))
+
+
+def _handler_name(data) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    return getattr(callback, "__name__", "?")
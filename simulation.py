@@ -0,0 +1,310 @@
+# simulation.py
+# Детерминированная симуляция учебного года за секунды:
+# виртуальные часы крутят настоящий run_scheduler, ученики ведут себя
+# по сценарию (болеют, отмечаются, отчитываются), Bot подменён заглушкой.
+#
+#   python simulation.py --start 2024-09-01 --end 2025-05-31 --students 30 --seed 1
+import argparse
+import asyncio
+import heapq
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import config
+
+# Своя БД в памяти — настоящий school_bot.db не трогаем
+config.DB_PATH = ":memory:"
+
+import main  # noqa: E402
+
+SICK_REASONS = ["болезнь", "врач", "семейные", "соревнования"]
+
+
+class SimulationFinished(Exception):
+    pass
+
+
+# === ВИРТУАЛЬНЫЕ ЧАСЫ ===
+# sleep() не ждёт, а перематывает время, по дороге выполняя
+# запланированные события сценария в хронологическом порядке.
+
+class VirtualClock:
+    def __init__(self, start: datetime, end: datetime):
+        self.current = start
+        self.end = end
+        self.agenda = []
+        self.seq = 0
+
+    def now(self) -> datetime:
+        return self.current
+
+    def call_at(self, when: datetime, callback):
+        self.seq += 1
+        heapq.heappush(self.agenda, (when, self.seq, callback))
+
+    async def sleep(self, seconds: float):
+        target = self.current + timedelta(seconds=seconds)
+        while self.agenda and self.agenda[0][0] <= target:
+            when, _, callback = heapq.heappop(self.agenda)
+            self.current = max(self.current, when)
+            await callback()
+        if target > self.end:
+            raise SimulationFinished
+        self.current = target
+
+
+# === ЗАГЛУШКИ TELEGRAM ===
+
+class FakeSent:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+
+class FakeBot:
+    def __init__(self, sim):
+        self.sim = sim
+        self.message_id = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sim.api_call()
+        self.message_id += 1
+        if text.startswith("🧹 Вы дежурный сегодня"):
+            self.sim.on_duty_assigned(chat_id)
+        return FakeSent(self.message_id)
+
+    async def edit_message_text(self, **kwargs):
+        self.sim.api_call()
+        return True
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = None
+
+
+class FakeMessage:
+    def __init__(self, sim, user_id: int, text: str):
+        self.sim = sim
+        self.from_user = FakeUser(user_id)
+        self.text = text
+
+    async def answer(self, text, **kwargs):
+        self.sim.api_call()
+
+
+class FakeState:
+    async def clear(self):
+        pass
+
+    async def set_state(self, state):
+        pass
+
+
+# === СЦЕНАРИЙ ===
+
+class Simulation:
+    def __init__(self, start: datetime, end: datetime, students: int, seed: int,
+                 sick_rate: float = 0.03, forget_rate: float = 0.05, extra_tap_rate: float = 0.2,
+                 resend_rate: float = 0.1):
+        self.rng = random.Random(seed)
+        self.start = start
+        self.school_days = 0
+        self.clock = VirtualClock(start, end)
+        self.students = {}
+        self.sick_until = {}
+        self.marked_month = {}
+        self.sick_rate = sick_rate
+        self.forget_rate = forget_rate
+        self.extra_tap_rate = extra_tap_rate
+        self.resend_rate = resend_rate
+        self.resends = 0
+        # Отдельный генератор: повторы отчёта не меняют остальной сценарий
+        self.resend_rng = random.Random(seed + 1)
+        self.duty_counts = Counter()
+        self.duty_today = None
+        self.days_without_duty = 0
+        self.queries = defaultdict(int)
+        self.api_calls = defaultdict(int)
+
+        for i in range(students):
+            user_id = 1000 + i
+            self.students[user_id] = f"Ученик{i:02d} Симуляцияев"
+        self._schedule(start, end)
+
+    def day(self):
+        return self.clock.now().date()
+
+    def api_call(self):
+        self.api_calls[self.day()] += 1
+
+    def on_query(self, statement):
+        self.queries[self.day()] += 1
+
+    def on_duty_assigned(self, user_id: int):
+        self.duty_today = user_id
+        self.duty_counts[user_id] += 1
+
+    def install(self):
+        main.clock = self.clock
+        main.bot = FakeBot(self)
+        main.TEACHER_ID = 1
+        main.current_channel = "@simulation"
+        main.attendance_queue.max_delay = 0
+        for user_id, name in sorted(self.students.items(), key=lambda item: item[1]):
+            main.cursor.execute(
+                "INSERT INTO users (user_id, name, role, approved) VALUES (?, ?, 'student', 1)",
+                (user_id, name)
+            )
+            main.journal.record("user_registered", user_id=user_id, name=name, role="student", approved=1)
+            main.add_to_duty_roster(name)
+        main.conn.commit()
+        main.conn.set_trace_callback(self.on_query)
+
+    def _schedule(self, start: datetime, end: datetime):
+        # Утро — за час до назначения дежурного, отчёт — через 6 часов после
+        duty = main.next_duty_time(start)
+        while duty <= end:
+            if duty.weekday() < 5:
+                self.school_days += 1
+                self.clock.call_at(duty - timedelta(hours=1), self.morning)
+                self.clock.call_at(duty + timedelta(hours=1), self.resend)
+                self.clock.call_at(duty + timedelta(hours=6), self.duty_report)
+            duty += timedelta(days=1)
+
+    async def morning(self):
+        self.duty_today = None
+        today = self.day()
+        month = (today.year, today.month)
+        taps = []
+        for user_id in self.students:
+            sick_until = self.sick_until.get(user_id)
+            if sick_until and sick_until >= today:
+                continue
+            if sick_until:
+                # Выздоровел
+                del self.sick_until[user_id]
+                taps.append(main.mark_present(FakeMessage(self, user_id, "✅ Приду в школу")))
+                self.marked_month[user_id] = month
+            elif self.rng.random() < self.sick_rate:
+                self.sick_until[user_id] = today + timedelta(days=self.rng.randint(1, 5))
+                reason = self.rng.choice(SICK_REASONS)
+                taps.append(main.mark_absent(FakeMessage(self, user_id, reason), FakeState()))
+            elif self.marked_month.get(user_id) != month or self.rng.random() < self.extra_tap_rate:
+                taps.append(main.mark_present(FakeMessage(self, user_id, "✅ Приду в школу")))
+                self.marked_month[user_id] = month
+        # Утренний «всплеск» — все нажимают почти одновременно
+        await asyncio.gather(*taps)
+
+    async def resend(self):
+        # Учитель иногда жмёт «📤 Повторить отчёт в канал» — очередь не должна сдвигаться
+        if self.resend_rng.random() < self.resend_rate:
+            self.resends += 1
+            await main.resend_channel_report(FakeMessage(self, main.TEACHER_ID, "📤 Повторить отчёт в канал"))
+
+    async def duty_report(self):
+        if self.duty_today is None:
+            self.days_without_duty += 1
+            return
+        if self.rng.random() >= self.forget_rate:
+            await main.report_duty(FakeMessage(self, self.duty_today, "🧹 Отчитаться о дежурстве"))
+
+    async def run(self):
+        self.install()
+        started = time.perf_counter()
+        try:
+            await main.run_scheduler()
+        except SimulationFinished:
+            pass
+        await main.attendance_queue.stop()
+        self.wall_time = time.perf_counter() - started
+
+    def summary(self, max_spread: int = 2) -> str:
+        counts = [self.duty_counts[user_id] for user_id in self.students]
+        roster = main.get_duty_list()
+        lost = set(self.students.values()) - set(roster)
+        queries = list(self.queries.values()) or [0]
+        calls = list(self.api_calls.values()) or [0]
+        stats = main.attendance_queue.stats
+
+        lines = [
+            "📊 Итоги симуляции",
+            f"Период: {self.start:%Y-%m-%d} — {self.clock.current:%Y-%m-%d}, "
+            f"учеников: {len(self.students)}, учебных дней: {self.school_days}",
+            "",
+            "🧹 Справедливость дежурств:",
+            f"  назначений: {sum(counts)}, дней без дежурного: {self.days_without_duty}, "
+            f"повторов отчёта: {self.resends}",
+            f"  на ученика: мин {min(counts)}, макс {max(counts)}, "
+            f"среднее {statistics.mean(counts):.2f}, σ {statistics.pstdev(counts):.2f}",
+            f"  в очереди в конце: {len(roster)}, выпали из очереди: {len(lost)}, "
+            f"дубликатов: {len(roster) - len(set(roster))}",
+            "",
+            "🗄 Запросы к БД в день:",
+            f"  среднее {statistics.mean(queries):.1f}, макс {max(queries)}, всего {sum(queries)}",
+            f"  транзакций очереди записи: {stats['batches']}, макс. пачка {stats['max_batch_seen']}",
+            f"  записей без изменений пропущено: {main.attendance_stats['suppressed_writes']}, "
+            f"строк: {main.attendance_stats['suppressed_rows']}",
+            "",
+            "📨 Вызовы Bot API в день:",
+            f"  среднее {statistics.mean(calls):.1f}, макс {max(calls)}, всего {sum(calls)}",
+            "",
+            "📜 Журнал событий:",
+            f"  событий: {main.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]}, "
+            f"контрольных точек: {main.conn.execute('SELECT COUNT(*) FROM checkpoints').fetchone()[0]}, "
+            f"совпадает с таблицами: {'да' if main.journal.verify() else 'НЕТ'}",
+            "",
+            f"⏱ Время: {self.wall_time:.2f} с",
+        ]
+        problems = self.problems(max_spread)
+        if problems:
+            lines += ["", "❌ Проверка не пройдена:"] + [f"  {problem}" for problem in problems]
+        else:
+            lines += ["", "✅ Проверка пройдена"]
+        return "\n".join(lines)
+
+    def problems(self, max_spread: int = 2) -> list:
+        # Очередь не теряет и не дублирует учеников, дежурства распределены ровно
+        counts = [self.duty_counts[user_id] for user_id in self.students]
+        roster = main.get_duty_list()
+        result = []
+        lost = sorted(set(self.students.values()) - set(roster))
+        if lost:
+            result.append(f"выпали из очереди: {', '.join(lost)}")
+        duplicates = sorted(name for name, count in Counter(roster).items() if count > 1)
+        if duplicates:
+            result.append(f"дубликаты в очереди: {', '.join(duplicates)}")
+        if max(counts) - min(counts) > max_spread:
+            result.append(f"разброс дежурств {max(counts) - min(counts)} больше {max_spread}")
+        if not main.journal.verify():
+            result.append("журнал не совпадает с таблицами")
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", default="2024-09-01")
+    parser.add_argument("--end", default="2025-05-31")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sick-rate", type=float, default=0.03)
+    parser.add_argument("--forget-rate", type=float, default=0.05)
+    parser.add_argument("--max-spread", type=int, default=2)
+    args = parser.parse_args()
+
+    sim = Simulation(
+        datetime.strptime(args.start, "%Y-%m-%d"),
+        datetime.strptime(args.end, "%Y-%m-%d") + timedelta(days=1),
+        args.students,
+        args.seed,
+        sick_rate=args.sick_rate,
+        forget_rate=args.forget_rate,
+    )
+    asyncio.run(sim.run())
+    print(sim.summary(args.max_spread))
+    if sim.problems(args.max_spread):
+        sys.exit(1)
@@ -0,0 +1,76 @@
+# throttling.py
+import time
+from collections import deque
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+
+# === АНТИДРЕБЕЗГ ВХОДЯЩИХ ===
+# Повторное нажатие той же кнопки тем же пользователем в пределах
+# duplicate_window секунд схлопывается: обработчик не вызывается.
+# Кроме того, от одного пользователя принимается не больше
+# rate_limit обновлений за rate_window секунд.
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, duplicate_window: float = 2.0, rate_limit: int = 20, rate_window: float = 10.0):
+        self.duplicate_window = duplicate_window
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.last_press = {}
+        self.recent = {}
+        self.stats = {"passed": 0, "dropped_duplicates": 0, "throttled": 0}
+
+    async def __call__(self, handler, event, data):
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._cleanup(now)
+
+        key = _press_key(event)
+        last = self.last_press.get(user.id)
+        if key is not None and last and last[0] == key and now - last[1] < self.duplicate_window:
+            self.stats["dropped_duplicates"] += 1
+            await _silence(event)
+            return None
+
+        recent = self.recent.setdefault(user.id, deque())
+        while recent and now - recent[0] >= self.rate_window:
+            recent.popleft()
+        if len(recent) >= self.rate_limit:
+            self.stats["throttled"] += 1
+            await _silence(event)
+            return None
+
+        recent.append(now)
+        self.last_press[user.id] = (key, now)
+        self.stats["passed"] += 1
+        return await handler(event, data)
+
+    def _cleanup(self, now: float):
+        # Не даём словарям расти бесконечно
+        if len(self.last_press) < 10000:
+            return
+        horizon = max(self.duplicate_window, self.rate_window)
+        for user_id in [uid for uid, (_, at) in self.last_press.items() if now - at >= horizon]:
+            del self.last_press[user_id]
+            self.recent.pop(user_id, None)
+
+
+def _press_key(event):
+    if isinstance(event, Message):
+        return ("text", event.text) if event.text else None
+    if isinstance(event, CallbackQuery):
+        return ("callback", event.data)
+    return None
+
+
+async def _silence(event):
+    # Для кнопок под сообщением нужно погасить «часики»
+    if isinstance(event, CallbackQuery):
+        try:
+            await event.answer()
+        except Exception as e:
+            print(f"[Антидребезг] {e}")
@@ -0,0 +1,111 @@
+# write_queue.py
+import asyncio
+import time
+
+
+# === ГРУППОВАЯ ЗАПИСЬ (group commit) ===
+# Обработчики кладут пачки строк в очередь и ждут, пока их пачка
+# окажется в БД. Фоновая задача собирает всё, что накопилось за
+# max_delay секунд (или max_batch пачек), и пишет одной транзакцией.
+
+class WriteQueue:
+    def __init__(self, conn, max_batch: int = 64, max_delay: float = 0.005):
+        self.conn = conn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = None
+        self.task = None
+        self.stats = {
+            "submitted": 0,
+            "rows": 0,
+            "batches": 0,
+            "max_batch_seen": 0,
+            "commit_seconds": 0.0,
+            "errors": 0,
+        }
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def submit(self, sql: str, rows: list):
+        # Возвращается только после COMMIT пачки, в которую попали строки
+        if not rows:
+            return
+        await self.submit_many([(sql, rows)])
+
+    async def submit_many(self, statements: list):
+        # statements: [(sql, rows), ...] — попадают в одну транзакцию
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.stats["submitted"] += 1
+        await self.queue.put((statements, future))
+        await future
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                if self.queue.empty():
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self.queue.get_nowait()
+                batch.append(item)
+
+            self._flush(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            with self.conn:
+                for statements, _ in batch:
+                    self._execute(statements)
+        except Exception:
+            # Одна битая пачка не должна валить остальные — пишем по одной
+            self.stats["errors"] += 1
+            for statements, future in batch:
+                try:
+                    with self.conn:
+                        self._execute(statements)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self._done(statements, future)
+        else:
+            for statements, future in batch:
+                self._done(statements, future)
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        self.stats["commit_seconds"] += time.perf_counter() - started
+
+    def _execute(self, statements: list):
+        for sql, rows in statements:
+            self.conn.executemany(sql, rows)
+
+    def _done(self, statements: list, future):
+        self.stats["rows"] += sum(len(rows) for _, rows in statements)
+        if not future.done():
+            future.set_result(None)